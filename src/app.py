@@ -4,6 +4,12 @@ warnings.filterwarnings("ignore")
 
 from bot import AkashBot
 from configs import settings
+from utils.metrics import metrics
 
-generator = AkashBot(x_settings=settings.x, openai_settings=settings.openai, akash_apis=settings.akash_api)
-generator.tweet_every_day(settings.bot.time, sleep=60*5)
+if settings.metrics.get('port'):
+    metrics.serve()
+
+generator = AkashBot(x_settings=settings.x, openai_settings=settings.openai, akash_apis=settings.akash_api,
+                     render_workers=settings.bot.render_workers, rolling=settings.get('rolling'),
+                     render=settings.bot.get('render'))
+generator.schedule(settings.bot.jobs, tz=settings.bot.get('tz', 'UTC')).run()
@@ -0,0 +1,161 @@
+import argparse
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
+
+warnings.filterwarnings("ignore")
+
+from configs import settings
+from utils.data import AkashStatsProcessor, granularities
+from utils.logger import logger
+from utils.render import init_worker
+from utils.report import Reporter
+from utils.requirements import resolve
+from utils.rolling import RollingMetrics
+from utils.schema import decode
+from utils.store import SnapshotStore
+
+
+def gpu_details_frame(names, totals, availables, prices):
+    import pandas as pd
+    from utils.market import fold_models
+
+    names, totals, availables, prices = fold_models(names, totals, availables, prices)
+    return pd.DataFrame({'model': names.astype(str), 'total': totals, 'available': availables, 'price': prices})
+
+
+def backfill_day(day, history, documents, gpu_details, directory, specs, rolling):
+    # Runs in a worker: the report and charts of one past day from the history up to and including it
+    import matplotlib.pyplot as plt
+    from utils.plot import create_gpu_availability_and_price_plot, create_gpu_plot, create_usd_plot
+
+    as_of = datetime.combine(day, datetime.min.time(), timezone.utc)
+    os.makedirs(directory, exist_ok=True)
+    # The archived dashboard of that day when there is one, otherwise the day and the one before it from the
+    # store, without chain stats
+    dashboard = documents.get('dashboard') or AkashStatsProcessor.dashboard(history)
+    snapshot = RollingMetrics(path=None, **rolling).update(history) if rolling is not None else None
+    report = Reporter().generate_report(documents.get('market'), dashboard, rolling=snapshot, as_of=as_of)
+    with open(os.path.join(directory, 'report.txt'), 'w', encoding='utf-8') as f:
+        f.write(report)
+
+    paths = []
+    try:
+        for spec in specs:
+            granularity, amount = spec['granularity'], spec['amount']
+            period = f'{amount}-{granularity}'
+            paths.append(os.path.join(directory, f'gpu_{period}.png'))
+            create_gpu_plot(history, name=paths[-1], granularity=granularity, amount=amount)
+            paths.append(os.path.join(directory, f'usd_{period}.png'))
+            create_usd_plot(history, name=paths[-1], granularity=granularity, amount=amount)
+        if gpu_details is not None:
+            paths.append(os.path.join(directory, 'gpu_details.png'))
+            create_gpu_availability_and_price_plot(gpu_details, name=paths[-1], as_of=as_of)
+    finally:
+        plt.close('all')
+    return day, paths
+
+
+class Backfill:
+    # Regenerates the reports and charts of past days from the snapshot store, plus the archived documents and the
+    # GPU market index where they cover the day. Days are spread over a process pool and written to
+    # <directory>/<YYYY-MM-DD>/, nothing is posted and no LLM descriptions are written
+
+    def __init__(self, store_path, archive=None, index_path=None, rolling=None, workers=None):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.store = SnapshotStore(store_path)
+        self.processor = AkashStatsProcessor(store=self.store)
+        self.archive = None
+        if archive:
+            from utils.archive import SnapshotArchive
+            self.archive = SnapshotArchive(**archive)
+        self.index = None
+        if index_path and os.path.exists(index_path):
+            from utils.market import GpuMarketIndex
+            self.index = GpuMarketIndex(index_path)
+        # Every day replays its own rolling window instead of sharing the bot's state file
+        self.rolling = {key: value for key, value in rolling.items() if key != 'path'} if rolling else None
+        self.workers = workers or os.cpu_count()
+        self.context = multiprocessing.get_context('forkserver')
+        self.context.set_forkserver_preload(['utils.plot'])
+
+    def documents(self, day, archived):
+        if day.isoformat() not in archived:
+            return {}
+        return {attr: decode(attr, body) for attr, body in self.archive.documents(day.isoformat()).items()
+                if attr in ('market', 'dashboard', 'gpu_prices')}
+
+    def gpu_details(self, day, documents):
+        import numpy as np
+
+        if 'gpu_prices' in documents:
+            models = documents['gpu_prices'].models
+            return gpu_details_frame([model.name for model in models], [model.total for model in models],
+                                     [model.available for model in models], [model.price for model in models])
+        if self.index is None:
+            return None
+        row = int(np.searchsorted(self.index.days, np.datetime64(day, 'D')))
+        if row == len(self.index.days) or self.index.days[row] != np.datetime64(day, 'D'):
+            return None
+        listed = self.index.total[row] >= 0
+        return gpu_details_frame(np.array(self.index.models, dtype=object)[listed], self.index.total[row, listed],
+                                 self.index.available[row, listed], self.index.price[row, listed])
+
+    def run(self, start, end, directory='backfill', specs=None):
+        specs = specs or [{'granularity': 'week', 'amount': 4}]
+        # Only the series the report, its charts and the rolling metrics read are built, the bot stores no others.
+        # The whole stored history of those is processed once, each day then only takes the rows up to itself
+        columns = RollingMetrics(path=None, **self.rolling).columns if self.rolling is not None else ()
+        _, attrs = resolve(['report', 'gpu_plot', 'usd_plot'], columns=columns)
+        series = self.store.snapshots(attrs)
+        missing = [attr for attr in attrs if attr not in series]
+        if missing:
+            raise ValueError(f"The snapshot store has no history of {', '.join(missing)}, run the bot first")
+        df = self.processor.build_frame(series, attrs)
+        rows = {day: i for i, day in enumerate(df['date'].dt.strftime('%Y-%m-%d'))}
+        windows = self.rolling.get('windows', (7, 30)) if self.rolling is not None else (0,)
+        samples = max([granularities[spec['granularity']] * spec['amount'] for spec in specs] +
+                      [max(windows) + 2])
+        archived = set(self.archive.days()) if self.archive is not None else set()
+
+        paths = {}
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=self.context,
+                                 initializer=init_worker) as executor:
+            futures = []
+            for offset in range((end - start).days + 1):
+                day = start + timedelta(days=offset)
+                row = rows.get(day.isoformat())
+                if row is None or row == 0:
+                    self.logger.warning(f"No stored snapshots for {day} and the day before, skipping it")
+                    continue
+                history = df.iloc[max(row + 1 - samples, 0):row + 1]
+                documents = self.documents(day, archived)
+                futures.append(executor.submit(backfill_day, day, history, documents,
+                                               self.gpu_details(day, documents),
+                                               os.path.join(directory, day.isoformat()), specs, self.rolling))
+            for done, future in enumerate(as_completed(futures), start=1):
+                day, day_paths = future.result()
+                paths[day] = day_paths
+                self.logger.debug(f"Backfilled {day} ({done}/{len(futures)})")
+        self.logger.info(f"Backfilled {len(paths)} days into {directory}")
+        return dict(sorted(paths.items()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Regenerate past daily reports and charts without posting them')
+    parser.add_argument('--start', type=date.fromisoformat, required=True, help='first day, YYYY-MM-DD')
+    parser.add_argument('--end', type=date.fromisoformat, help='last day (inclusive), the start day by default')
+    parser.add_argument('--out', default='backfill', help='output directory, one subdirectory per day')
+    parser.add_argument('--granularity', default='week', choices=list(granularities))
+    parser.add_argument('--amount', type=int, default=4)
+    parser.add_argument('--workers', type=int, help='worker processes, all cores by default')
+    args = parser.parse_args()
+
+    backfill = Backfill(settings.akash_api.store_path, archive=settings.akash_api.get('archive'),
+                        index_path=settings.akash_api.get('index_path'), rolling=settings.get('rolling'),
+                        workers=args.workers)
+    backfill.run(args.start, args.end or args.start, directory=args.out,
+                 specs=[{'granularity': args.granularity, 'amount': args.amount}])
@@ -0,0 +1,77 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from benchmarks.synthetic import synthetic_data
+from utils.archive import SnapshotArchive, require_pyarrow
+from utils.logger import logger
+from utils.schema import decode
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+
+
+def write_days(directory, days, history, compression):
+    # One full fetch per day, both as the old indented JSON dumps and as archive partitions
+    archive = SnapshotArchive(os.path.join(directory, 'archive'), compression=compression)
+    start = date(2025, 1, 1)
+    for offset in range(days):
+        day = (start + timedelta(days=offset)).isoformat()
+        raw = synthetic_data(days=history, seed=offset)
+        json_directory = os.path.join(directory, 'json', day)
+        os.makedirs(json_directory, exist_ok=True)
+        for attr, payload in raw.items():
+            with open(os.path.join(json_directory, f'{attr}.json'), 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False, indent=4)
+        bodies = {attr: json.dumps(payload).encode('utf-8') for attr, payload in raw.items()}
+        archive.write({attr: decode(attr, body) for attr, body in bodies.items()}, bodies, day=day)
+    return archive
+
+
+def load_json(directory):
+    data = {}
+    for day in sorted(os.listdir(directory)):
+        for name in os.listdir(os.path.join(directory, day)):
+            with open(os.path.join(directory, day, name), 'r', encoding='utf-8') as f:
+                data[day, name] = json.load(f)
+    return data
+
+
+def benchmark(days=90, history=365, compression='zstd'):
+    pa = require_pyarrow()
+    with tempfile.TemporaryDirectory() as directory:
+        archive = write_days(directory, days, history, compression)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        data = load_json(os.path.join(directory, 'json'))
+        json_time = time.perf_counter() - start
+        json_memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del data
+
+        allocated = pa.total_allocated_bytes()
+        start = time.perf_counter()
+        table = archive.scan()
+        archive_time = time.perf_counter() - start
+        archive_memory = pa.total_allocated_bytes() - allocated
+
+        logger.info(f"{days} days of {history}-day fetches ({table.num_rows} series rows): "
+                    f"indented JSON {directory_size(os.path.join(directory, 'json')) / 2 ** 20:.1f}MiB on disk, "
+                    f"load {json_time:.2f}s / {json_memory / 2 ** 20:.0f}MiB | "
+                    f"{compression or 'uncompressed'} archive {directory_size(archive.directory) / 2 ** 20:.1f}MiB, "
+                    f"load {archive_time:.2f}s / {archive_memory / 2 ** 20:.0f}MiB allocated")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Loading months of archived fetches vs indented JSON dumps')
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--history', type=int, default=365)
+    parser.add_argument('--compression', default='zstd', help="zstd, lz4 or none for a zero-copy memory map")
+    args = parser.parse_args()
+    benchmark(args.days, args.history, None if args.compression == 'none' else args.compression)
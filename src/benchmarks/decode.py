@@ -0,0 +1,35 @@
+import json
+import time
+import tracemalloc
+
+from benchmarks.synthetic import synthetic_data
+from utils.logger import logger
+from utils.schema import decode
+
+
+def measure(function, bodies, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(bodies)
+    elapsed = (time.perf_counter() - start) / repeat
+    # Memory still held by the decoded data dict once parsing is over
+    tracemalloc.start()
+    result = function(bodies)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, retained
+
+
+def benchmark(years=(1, 2, 5, 10)):
+    for amount in years:
+        bodies = {attr: json.dumps(payload).encode('utf-8')
+                  for attr, payload in synthetic_data(days=365 * amount).items()}
+        _, plain_time, plain_memory = measure(lambda b: {attr: json.loads(body) for attr, body in b.items()}, bodies)
+        _, typed_time, typed_memory = measure(lambda b: {attr: decode(attr, body) for attr, body in b.items()}, bodies)
+        logger.info(f"{amount:>2}y ({sum(map(len, bodies.values())) / 2 ** 20:.1f}MiB of JSON): "
+                    f"json.loads {plain_time * 1000:.1f}ms / {plain_memory / 2 ** 20:.1f}MiB held, "
+                    f"typed {typed_time * 1000:.1f}ms / {typed_memory / 2 ** 20:.1f}MiB held")
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,45 @@
+import argparse
+import os
+import subprocess
+import sys
+
+from utils.logger import logger
+
+modules = ['bot', 'utils.data', 'utils.report', 'utils.render', 'utils.plot', 'llm.openai']
+heavy = ['pandas', 'numpy', 'matplotlib', 'seaborn', 'tweepy', 'openai', 'requests', 'bs4']
+
+
+def import_time(module, repeat=5):
+    # Cold import of one module in a fresh interpreter, best of `repeat` runs of -X importtime in microseconds,
+    # together with the heavy libraries that import pulled in
+    best = None
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)}
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                                 f'import sys, {module}; print(",".join(sorted(sys.modules)))'],
+                                capture_output=True, text=True, env=env, check=True)
+        cumulative = {}
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                _, total, name = line[len('import time:'):].split('|')
+                if total.strip().isdigit():
+                    cumulative[name.strip()] = int(total)
+        total = cumulative[module]
+        if best is None or total < best[0]:
+            loaded = set(result.stdout.strip().split(','))
+            best = (total, [library for library in heavy if library in loaded])
+    return best
+
+
+def benchmark(names=modules, repeat=5):
+    for module in names:
+        total, loaded = import_time(module, repeat=repeat)
+        logger.info(f"{module:>14}: {total / 1000:7.1f}ms, loads {', '.join(loaded) or 'no heavy libraries'}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cold import time of the bot modules')
+    parser.add_argument('--modules', nargs='+', default=modules)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    benchmark(args.modules, repeat=args.repeat)
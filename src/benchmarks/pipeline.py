@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import functools
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.replay import FakeOpenAIServer, FixtureServer
+from benchmarks.synthetic import synthetic_data
+from bot import AkashBot
+from utils.logger import logger
+
+sizes = {'small': 90, 'medium': 2 * 365, 'multi-year': 6 * 365}
+stages = ['fetch', 'process', 'report', 'render', 'summarise', 'post']
+
+
+class ReplaySettings(dict):
+    # Attribute access like the dynaconf settings sections the bot is normally given
+    __getattr__ = dict.__getitem__
+
+
+class StageTimer:
+
+    def __init__(self):
+        self.durations = dict.fromkeys(stages, 0.0)
+
+    def add(self, stage, start):
+        self.durations[stage] += time.perf_counter() - start
+
+    def wrap(self, stage, function):
+        @functools.wraps(function)
+        def wrapped(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(stage, start)
+        return wrapped
+
+    def wrap_async(self, stage, function):
+        @functools.wraps(function)
+        async def wrapped(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                self.add(stage, start)
+        return wrapped
+
+
+def replay_bot(api, llm, directory, render_workers=3, render=None):
+    # A bot wired to the local fixture server, the fake LLM endpoint and the fake X clients
+    x_settings = ReplaySettings({'dry_run': True})
+    openai_settings = ReplaySettings({'base_url': f'{llm.url}/v1', 'api_key': 'replay', 'model': 'DeepSeek-R1',
+                               'timeout': 60, 'max_concurrency': 8, 'stream': True})
+    akash_apis = ReplaySettings({'console_server': api.console_server, 'cloudmos_server': api.cloudmos_server,
+                          'store_path': os.path.join(directory, 'snapshots.db')})
+    bot = AkashBot(x_settings, openai_settings, akash_apis, render_workers=render_workers, render=render)
+    api.register(bot.retriever)
+    return bot
+
+
+def instrument(bot, timer):
+    bot.retriever.retrieve = timer.wrap('fetch', bot.retriever.retrieve)
+    bot.processor = timer.wrap('process', bot.processor)
+    bot.reporter.generate_report = timer.wrap('report', bot.reporter.generate_report)
+    bot.renderer.render = timer.wrap('render', bot.renderer.render)
+    bot.summarise = timer.wrap_async('summarise', bot.summarise)
+    bot.publish_batch = timer.wrap('post', bot.publish_batch)
+
+
+def run(days, specs, api_latency=0.05, llm_latency=2.0, trace_memory=True, max_bytes=None, warm=False):
+    data = synthetic_data(days=days)
+    with tempfile.TemporaryDirectory() as directory, \
+            FixtureServer(data, latency=api_latency) as api, FakeOpenAIServer(latency=llm_latency) as llm:
+        render = {'max_bytes': max_bytes}
+        if warm:
+            render['cache'] = {'directory': os.path.join(directory, 'plots')}
+        bot = replay_bot(api, llm, directory, render=render)
+        if warm:
+            # A first run fills the render cache, the timed one then finds its charts unchanged
+            bot.prepare_batch(specs, plot_dir=os.path.join(directory, 'plots'))
+        timer = StageTimer()
+        instrument(bot, timer)
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        batch = bot.prepare_batch(specs, plot_dir=os.path.join(directory, 'plots'))
+        bot.publish_batch(batch)
+        total = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+        tracemalloc.stop()
+    return timer.durations, total, peak
+
+
+def benchmark(names=tuple(sizes), specs=({'granularity': 'week', 'amount': 4},), **kwargs):
+    for name in names:
+        durations, total, peak = run(sizes[name], list(specs), **kwargs)
+        logger.info(f"{name:>10} ({sizes[name]} days): total {total:.2f}s, python peak {peak / 2 ** 20:.1f}MiB, "
+                    f"max rss {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10:.0f}MiB | " +
+                    ', '.join(f"{stage} {duration:.2f}s" for stage, duration in durations.items()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmark of the thread generation pipeline')
+    parser.add_argument('--sizes', nargs='+', default=list(sizes), choices=list(sizes))
+    parser.add_argument('--api-latency', type=float, default=0.05)
+    parser.add_argument('--llm-latency', type=float, default=2.0)
+    parser.add_argument('--batch', action='store_true', help='day x7, week x4, month x12 and year x1 in one batch')
+    parser.add_argument('--max-bytes', type=int, help='byte budget per chart, re-encodes them to fit')
+    parser.add_argument('--warm', action='store_true', help='time a second run against the filled render cache')
+    args = parser.parse_args()
+    specs = ([{'granularity': 'day', 'amount': 7}, {'granularity': 'week', 'amount': 4},
+              {'granularity': 'month', 'amount': 12}, {'granularity': 'year', 'amount': 1}]
+             if args.batch else [{'granularity': 'week', 'amount': 4}])
+    benchmark(args.sizes, specs, api_latency=args.api_latency, llm_latency=args.llm_latency,
+              max_bytes=args.max_bytes, warm=args.warm)
@@ -0,0 +1,59 @@
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_data
+from utils.data import AkashStatsProcessor
+from utils.logger import logger
+from utils.schema import Series
+
+
+def legacy_frame(data):
+    # AkashStatsProcessor frame construction before the single-pass builder, kept as the benchmark baseline
+    dfs = []
+    for attr in AkashStatsProcessor.attrs:
+        df = pd.DataFrame(data[attr]["snapshots"])
+        df["date"] = pd.to_datetime(df["date"])
+        df.set_index("date", inplace=True)
+        df.columns = [attr]
+        dfs.append(df)
+
+    df = pd.concat(dfs, join="inner", axis=1)
+    df = df.reset_index()
+    df.rename(columns=AkashStatsProcessor.renames, inplace=True)
+    df['utilization'] = df['activeGPU'] / df['totalGPU']
+    df['totalUsdSpent'] = df['totalUsdSpent'] / 1000000
+    df['totalAktSpent'] = df['totalAktSpent'] / 1000000
+    df['dailyAktSpent'] = df['dailyAktSpent'] / 1000000
+    df['dailyUsdSpent'] = df['dailyUsdSpent'] / 1000000
+    return df
+
+
+def measure(function, *args, repeat=5):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(*args)
+    elapsed = (time.perf_counter() - start) / repeat
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def benchmark(years=(1, 2, 5, 10)):
+    processor = AkashStatsProcessor()
+    for amount in years:
+        data = synthetic_data(days=365 * amount)
+        series = {attr: Series.decode(data[attr]) for attr in processor.attrs}
+        legacy, legacy_time, legacy_peak = measure(legacy_frame, data)
+        df, time_, peak = measure(processor.build_frame, series)
+        pd.testing.assert_frame_equal(legacy, df, check_dtype=False)
+        logger.info(f"{amount:>2}y ({len(df)} rows): legacy {legacy_time * 1000:.1f}ms / {legacy_peak / 2 ** 20:.1f}MiB, "
+                    f"single-pass {time_ * 1000:.1f}ms / {peak / 2 ** 20:.1f}MiB, "
+                    f"frame {legacy.memory_usage(deep=True).sum() / 2 ** 10:.0f}KiB -> "
+                    f"{df.memory_usage(deep=True).sum() / 2 ** 10:.0f}KiB")
+
+
+if __name__ == '__main__':
+    benchmark()
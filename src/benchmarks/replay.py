@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from utils.logger import logger
+
+
+def record_fixtures(retriever, directory='data/fixtures'):
+    # Saves one live response per attr2url endpoint so later runs can be replayed offline
+    os.makedirs(directory, exist_ok=True)
+    for attr in retriever.attr2url:
+        with open(os.path.join(directory, f'{attr}.json'), 'wb') as f:
+            f.write(retriever.fetch_body(attr))
+    logger.info(f"Recorded {len(retriever.attr2url)} fixtures to {directory}")
+
+
+def load_fixtures(directory='data/fixtures'):
+    data = {}
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                data[name[:-len('.json')]] = json.load(f)
+    return data
+
+
+def load_archive(directory='data/archive', day=None):
+    # API-shaped payloads of one archived day (the latest by default), ready for a FixtureServer
+    from utils.archive import SnapshotArchive
+
+    return SnapshotArchive(directory).payloads(day)
+
+
+class BackgroundServer:
+
+    def __init__(self, handler):
+        super().__init__()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FixtureServer(BackgroundServer):
+    # Serves a retrieve('all')-shaped data dict on the console-api and cloudmos paths, with ETags and latency.
+    # latencies overrides the latency per attr (seconds or a function returning them), failing attrs answer 503
+
+    def __init__(self, data, latency=0.05, latencies=None, failing=()):
+        self.bodies = {}
+        for attr, payload in data.items():
+            body = json.dumps(payload).encode('utf-8')
+            self.bodies[attr] = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+        self.routes = {}
+        self.latency = latency
+        self.latencies = dict(latencies or {})
+        self.failing = set(failing)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                attr = server.routes.get(urlparse(self.path).path)
+                latency = server.latencies.get(attr, server.latency)
+                time.sleep(latency() if callable(latency) else latency)
+                if attr in server.failing:
+                    self.send_error(503)
+                    return
+                if attr is None or attr not in server.bodies:
+                    self.send_error(404)
+                    return
+                body, etag = server.bodies[attr]
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(Handler)
+
+    @property
+    def console_server(self):
+        return f'{self.url}/v1/'
+
+    @property
+    def cloudmos_server(self):
+        return f'{self.url}/internal/'
+
+    def register(self, retriever):
+        # Routes every endpoint the retriever will call to the fixture of the same attr
+        self.routes.update({urlparse(url).path: attr for attr, url in retriever.attr2url.items()})
+        return retriever
+
+
+class FakeOpenAIServer(BackgroundServer):
+    # OpenAI-compatible /chat/completions that answers after a configurable latency, streamed or not
+
+    def __init__(self, latency=2.0, text=None, reasoning=200, chunk_size=8, chunk_delay=0.005):
+        self.latency = latency
+        self.reasoning = reasoning
+        self.text = text or ('Active GPUs kept climbing over the period while total capacity grew at a slower pace, '
+                             'pushing utilization higher. Daily spend followed the same trend with a few dips on '
+                             'weekends. Overall the network shows steady demand growth. ') * 2
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                server.requests += 1
+                time.sleep(server.latency)
+                # Every prompt gets its own text, X would refuse the same description posted twice
+                digest = hashlib.sha1(json.dumps(request['messages']).encode('utf-8')).hexdigest()[:6]
+                content = f"<think>{'x' * server.reasoning}</think>\n\n[{digest}] {server.text}"
+                if request.get('stream'):
+                    self.stream(request, content)
+                else:
+                    self.complete(request, content)
+
+            def complete(self, request, content):
+                body = json.dumps({'id': 'chatcmpl-replay', 'object': 'chat.completion', 'created': int(time.time()),
+                                   'model': request['model'],
+                                   'choices': [{'index': 0, 'finish_reason': 'stop',
+                                                'message': {'role': 'assistant', 'content': content}}],
+                                   'usage': {'prompt_tokens': len(json.dumps(request['messages'])) // 4,
+                                             'completion_tokens': len(content) // 4,
+                                             'total_tokens': (len(json.dumps(request['messages'])) + len(content)) // 4}
+                                   }).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def stream(self, request, content):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                try:
+                    for start in range(0, len(content), server.chunk_size):
+                        chunk = {'id': 'chatcmpl-replay', 'object': 'chat.completion.chunk',
+                                 'created': int(time.time()), 'model': request['model'],
+                                 'choices': [{'index': 0, 'finish_reason': None,
+                                              'delta': {'content': content[start:start + server.chunk_size]}}]}
+                        self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+                        self.wfile.flush()
+                        time.sleep(server.chunk_delay)
+                    self.wfile.write(b'data: [DONE]\n\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading once its character budget was filled
+                    pass
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(Handler)
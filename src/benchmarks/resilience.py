@@ -0,0 +1,56 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.replay import FixtureServer
+from benchmarks.synthetic import synthetic_data
+from utils.data import AkashStatsRetriever
+from utils.logger import logger
+
+
+def tail(rng, slow=3.0, probability=0.2, latency=0.05):
+    # Mostly fast with the occasional stall, like the cloudmos gpu-prices endpoint
+    return lambda: slow if rng.random() < probability else latency
+
+
+def run(retriever, runs):
+    durations, stale = [], {}
+    for _ in range(runs):
+        start = time.perf_counter()
+        retriever.retrieve('all', stale=stale)
+        durations.append(time.perf_counter() - start)
+    return sorted(durations)
+
+
+def benchmark(runs=20, seed=0, deadline=5.0):
+    data = synthetic_data(days=90)
+    with tempfile.TemporaryDirectory() as directory:
+        for name, options in [('plain', {}),
+                              ('resilient', {'deadline': deadline,
+                                             'hedge': {'path': os.path.join(directory, 'latency.json')},
+                                             'breaker': {'failures': 3, 'reset_after': 600}})]:
+            rng = random.Random(seed)
+            latencies = {'gpu_prices': tail(rng), 'market': tail(rng, probability=0.1)}
+            with FixtureServer(data, latencies=latencies) as server:
+                # Every endpoint answers once so the resilient retriever has responses to fall back to
+                cache = {'directory': os.path.join(directory, name, 'http_cache'), 'default_ttl': 0}
+                retriever = server.register(AkashStatsRetriever(server.console_server, server.cloudmos_server,
+                                                                retries=0, cache=cache, **options))
+                retriever.retrieve('all')
+                # dashboard goes down for good and gpu_details hangs past every timeout
+                server.failing.add('dashboard')
+                server.latencies['gpu_details'] = 60.0
+                retriever.timeouts['gpu_details'] = 30.0
+                durations = run(retriever, runs)
+            logger.info(f"{name:>9}: fetch p50 {durations[len(durations) // 2]:.2f}s, "
+                        f"p95 {durations[int(0.95 * (len(durations) - 1))]:.2f}s, max {durations[-1]:.2f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fetch times with slow, failing and hanging endpoints')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--deadline', type=float, default=5.0)
+    args = parser.parse_args()
+    benchmark(args.runs, deadline=args.deadline)
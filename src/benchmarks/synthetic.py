@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from utils.data import AkashStatsRetriever
+
+# Rough magnitudes of each series so synthetic histories look like the real network
+scales = {'activeLeaseCount': 1500, 'totalLeaseCount': 500000, 'dailyLeaseCount': 800,
+          'totalUAktSpent': 3e12, 'dailyUAktSpent': 5e9, 'totalUUsdcSpent': 1e12, 'dailyUUsdcSpent': 3e9,
+          'totalUUsdSpent': 8e12, 'dailyUUsdSpent': 1.5e10, 'activeCPU': 20000000, 'activeGPU': 350,
+          'activeMemory': 8e13, 'activeStorage': 6e14, 'cpu': 60000000, 'gpu': 600, 'memory': 2e14,
+          'storage': 4e15, 'count': 80}
+gpu_models = [('h100', '80Gi', 'SXM5'), ('a100', '80Gi', 'SXM4'), ('rtx4090', '24Gi', 'PCIe'),
+              ('a6000', '48Gi', 'PCIe'), ('rtx3090', '24Gi', 'PCIe'), ('v100', '32Gi', 'SXM2'),
+              ('h200', '141Gi', 'SXM5'), ('l40s', '48Gi', 'PCIe'), ('t4', '16Gi', 'PCIe'), ('p100', '16Gi', 'PCIe')]
+
+
+def synthetic_series(attr, days, end, rng):
+    trend = np.linspace(0.2, 1.0, days) * scales[attr]
+    values = np.maximum(trend * (1 + rng.normal(0, 0.05, days)), 0).round()
+    dates = [(end - timedelta(days=days - 1 - i)).strftime('%Y-%m-%dT%H:%M:%S.000Z') for i in range(days)]
+    return {'currentValue': int(values[-1]), 'compareValue': int(values[-2]),
+            'snapshots': [{'date': date, 'value': int(value)} for date, value in zip(dates, values)]}
+
+
+def synthetic_data(days=365, seed=0, end=None):
+    # Same shape as AkashStatsRetriever.retrieve('all') for a history of the given length
+    rng = np.random.default_rng(seed)
+    end = end or datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    data = {attr: synthetic_series(attr, days, end, rng)
+            for attr in AkashStatsRetriever.provider_series + AkashStatsRetriever.graph_series}
+    now = {attr: data[attr]['snapshots'][-1]['value'] for attr in AkashStatsRetriever.graph_series}
+    compare = {attr: data[attr]['snapshots'][-2]['value'] for attr in AkashStatsRetriever.graph_series}
+    now['date'], compare['date'] = data['activeGPU']['snapshots'][-1]['date'], data['activeGPU']['snapshots'][-2]['date']
+    data['dashboard'] = {'now': now, 'compare': compare,
+                         'networkCapacity': {'totalGPU': now['activeGPU'] * 2, 'activeProviderCount': 80},
+                         'chainStats': {'stakingAPR': 0.12, 'bondedTokens': 1.6e14, 'totalSupply': 2.6e14}}
+    data['market'] = {'price': float(rng.uniform(1, 5)), 'priceChangePercentage24': float(rng.normal(0, 3))}
+    data['gpu_details'] = {'gpus': {'total': int(now['activeGPU'] * 2), 'details': {}}}
+    models = []
+    for model, ram, interface in gpu_models:
+        total = int(rng.integers(1, 300))
+        price = round(float(rng.uniform(0.1, 3.0)), 2)
+        models.append({'vendor': 'nvidia', 'model': model, 'ram': ram, 'interface': interface,
+                       'availability': {'total': total, 'available': int(rng.integers(0, total + 1))},
+                       'price': {'min': price / 2, 'max': price * 2, 'avg': price} if rng.random() > 0.2 else None})
+    data['gpu_prices'] = {'availability': {'total': sum(m['availability']['total'] for m in models)}, 'models': models}
+    return data
@@ -0,0 +1,56 @@
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import seaborn as sns
+from matplotlib.dates import date2num
+
+from benchmarks.synthetic import synthetic_data
+from utils.data import AkashStatsProcessor
+from utils.logger import logger
+from utils.plot import draw_trend
+from utils.trend import fit_trends, methods
+
+columns = ['activeGPU', 'totalGPU', 'utilization']
+colors = ['blue', 'green', 'red']
+
+
+def regplot_trends(data):
+    # create_gpu_plot trend lines before the trend engine, three bootstrapped order-2 regplots
+    fig, ax = plt.subplots(figsize=(10, 5))
+    x = date2num(data['date'])
+    for column, color in zip(columns, colors):
+        sns.regplot(x=x, y=data[column], ax=ax, scatter=False, line_kws={"color": color, "linewidth": 1}, order=2)
+    plt.close(fig)
+
+
+def engine_trends(data, method):
+    fig, ax = plt.subplots(figsize=(10, 5))
+    trends = fit_trends(date2num(data['date']), data[columns], method=method, ci=95)
+    for i, color in enumerate(colors):
+        draw_trend(ax, data['date'], trends, i, color=color)
+    plt.close(fig)
+
+
+def timed(function, *args, repeat=3):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(*args)
+    return (time.perf_counter() - start) / repeat
+
+
+def benchmark(samples=(28, 90, 365, 730)):
+    df, *_ = AkashStatsProcessor()(synthetic_data(days=max(samples)))
+    for amount in samples:
+        data = df.tail(amount)
+        regplot = timed(regplot_trends, data)
+        engine = {method: timed(engine_trends, data, method) for method in methods}
+        logger.info(f"{amount:>4} samples: regplot {regplot * 1000:.0f}ms, " +
+                    ', '.join(f"{method} {elapsed * 1000:.1f}ms ({regplot / elapsed:.0f}x)"
+                              for method, elapsed in engine.items()))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -1,125 +1,253 @@
+import asyncio
+import functools
 import os
+import threading
 import traceback
 from datetime import datetime, timezone
 
-import pytz
-import schedule
-import tweepy
-from openai import OpenAI
 from utils.logger import logger
-from llm.openai import llm_data_report_request
-from utils.plot import create_gpu_plot, create_gpu_availability_and_price_plot, create_usd_plot
-from utils.data import AkashStatsRetriever, AkashStatsProcessor
+from llm.cache import ResponseCache
+from llm.openai import summarise_sections
+from bot.fake import FakeXAPI, FakeXClient
+from bot.publisher import ThreadPublisher
+from bot.scheduler import Job, Scheduler
+from utils.data import AkashStatsRetriever, AkashStatsProcessor, granularities
+from utils.metrics import metrics
+from utils.render import PlotRenderer
 from utils.report import Reporter
-import time
+from utils.requirements import requirements, resolve
+from utils.rolling import RollingMetrics
 
 
 class AkashBot:
-    granularities = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+    granularities = granularities
+    final_tweet = 'Check the official Akash Stats page for more details https://stats.akash.network/'
 
-    def __init__(self, x_settings, openai_settings, akash_apis):
+    def __init__(self, x_settings, openai_settings, akash_apis, render_workers=3, rolling=None, render=None):
         super().__init__()
         self.logger = logger.bind(classname=self.__class__.__name__)
-        self.x_v1 = tweepy.API(tweepy.OAuth1UserHandler(x_settings.consumer_key,
-                                                        x_settings.consumer_secret,
-                                                        x_settings.access_token,
-                                                        x_settings.access_token_secret))
-
-        self.x_client = tweepy.Client(
-            consumer_key=x_settings.consumer_key,
-            consumer_secret=x_settings.consumer_secret,
-            access_token=x_settings.access_token,
-            access_token_secret=x_settings.access_token_secret
-        )
-
-        self.openai_client = OpenAI(base_url=openai_settings.base_url, api_key=openai_settings.api_key)
+        if x_settings.get('dry_run', False):
+            self.x_v1 = FakeXAPI()
+            self.x_client = FakeXClient()
+        else:
+            import requests
+            import tweepy
+
+            self.x_v1 = tweepy.API(tweepy.OAuth1UserHandler(x_settings.consumer_key,
+                                                            x_settings.consumer_secret,
+                                                            x_settings.access_token,
+                                                            x_settings.access_token_secret))
+
+            # Raw responses so the publisher can read the x-rate-limit-* headers
+            self.x_client = tweepy.Client(
+                consumer_key=x_settings.consumer_key,
+                consumer_secret=x_settings.consumer_secret,
+                access_token=x_settings.access_token,
+                access_token_secret=x_settings.access_token_secret,
+                return_type=requests.Response
+            )
+        self.publisher = ThreadPublisher(self.x_v1, self.x_client,
+                                         upload_workers=x_settings.get('upload_workers', 4),
+                                         min_interval=x_settings.get('min_interval', 0.0))
+
+        self.openai_settings = openai_settings
         self.model = openai_settings.model
+        self.llm_cache = ResponseCache(**openai_settings.cache) if openai_settings.get('cache') else None
         self.retriever = AkashStatsRetriever(**akash_apis)
-        self.processor = AkashStatsProcessor()
+        self.processor = AkashStatsProcessor(store=self.retriever.store)
         self.reporter = Reporter()
+        self.rolling = RollingMetrics(**rolling) if rolling else None
+        # Scheduled jobs prepare in their own threads but share the rolling state file and the plot names, which
+        # only go down to the second, so one batch is prepared at a time
+        self.prepare_lock = threading.Lock()
+        self.renderer = PlotRenderer(max_workers=render_workers, **(render or {}))
 
     def upload_media(self, filepath):
-        media = self.x_v1.media_upload(filepath)
-        media_id = media.media_id_string
-        self.logger.debug(f"Uploaded media {filepath} ID: {media_id}")
-        return media_id
-
-    def post_tweet(self, report, tweets, images):
-        # Post the first tweet and get its tweet ID
-        response = self.x_client.create_tweet(text=report)
-        first_tweet_id = response.data['id']
-        self.logger.info(f"First tweet posted with ID: {first_tweet_id}")
-
-        # Use the first tweet's ID as the reply reference for the next tweets
-        reply_to_tweet_id = first_tweet_id
-
-        # Post each subsequent tweet as a reply to the previous tweet
-        for i, (tweet, image) in enumerate(zip(tweets, images)):
-            time.sleep(1)
-            media_id = self.upload_media(image)
-            time.sleep(1)
-            response = self.x_client.create_tweet(text=tweet, media_ids=[media_id],
-                                                  in_reply_to_tweet_id=reply_to_tweet_id)
-            reply_to_tweet_id = response.data['id']
-            self.logger.info(f"Tweet posted as reply with ID: {reply_to_tweet_id}")
-        time.sleep(1)
-        final_tweet = 'Check the official Akash Stats page for more details https://stats.akash.network/'
-        self.x_client.create_tweet(text=final_tweet, in_reply_to_tweet_id=reply_to_tweet_id)
-        self.logger.info(f"Posted final tweet: {reply_to_tweet_id}")
-
-    def tweet_every_day(self, time_str, tz='UTC', sleep=300):
-
-        schedule.every().day.at(time_str, tz=pytz.timezone(tz)).do(self.generate, granularity='week', amount=4)
-
-        self.logger.info('Starting Akash bot scheduler')
-        while True:
-            schedule.run_pending()
-            time.sleep(sleep)
-
-    def generate(self, granularity='week', amount=4, plot_dir='plots/'):
+        return self.publisher.upload_media(filepath)
+
+    def post_tweet(self, report, tweets, images, final_tweet=None):
+        # images are file paths, media ids or pending upload futures
+        media = [self.publisher.executor.submit(self.upload_media, image) if isinstance(image, str) else image
+                 for image in images]
+        self.publisher.post_thread(report, tweets, media, final_tweet=final_tweet or self.final_tweet)
+
+    async def summarise(self, sections, fallbacks):
+        # A fresh async client per run, its connection pool is bound to the event loop of this run
+        from openai import AsyncOpenAI
+
+        async with AsyncOpenAI(base_url=self.openai_settings.base_url,
+                               api_key=self.openai_settings.api_key) as client:
+            return await summarise_sections(client, sections, fallbacks, model=self.model,
+                                            timeout=self.openai_settings.get('timeout', 120),
+                                            max_concurrency=self.openai_settings.get('max_concurrency', 3),
+                                            stream=self.openai_settings.get('stream', True),
+                                            cache=self.llm_cache)
+
+    def data_version(self):
+        # Date of the newest daily snapshot, revalidated against the API so a new day shows up right away
+        import pandas as pd
+
+        dates = self.retriever.fetch('activeGPU', revalidate=True).dates
+        return pd.Timestamp(dates[-1]) if dates else None
+
+    def is_stale(self, batch):
         try:
-            os.makedirs(plot_dir, exist_ok=True)
-            current_time = datetime.now(timezone.utc)
-            formatted_time = current_time.strftime("%Y-%m-%d_%H:%M:%S_%Z")
-            self.logger.info(f"Current time: {formatted_time}")
-
-            data = self.retriever.retrieve('all')
-            df, gpu_details, market_details, dashboard = self.processor(data)
-            report = self.reporter.generate_report(market_details, dashboard)
+            # Every thread of a batch comes from the same fetch and carries the same version
+            return bool(batch) and self.data_version() != batch[0]['version']
+        except Exception as e:
+            self.logger.warning(f"Could not check data freshness, keeping prepared thread: {e!r}")
+            return False
+
+    def schedule(self, jobs, tz='UTC'):
+        scheduler = Scheduler()
+        for job in jobs:
+            # A job either posts one report or fans out to several that share a single fetch
+            specs = job.get('reports') or [{'granularity': job.get('granularity', 'week'),
+                                            'amount': job.get('amount', 4)}]
+            scheduler.add(Job(job['name'], job['time'],
+                              prepare=functools.partial(self.prepare_batch, [dict(spec) for spec in specs]),
+                              publish=self.publish_batch, is_stale=self.is_stale, lead=job.get('lead', 0),
+                              refresh=job.get('refresh', 120),
+                              days=job.get('days'), tz=job.get('tz', tz)))
+        return scheduler
+
+    def tweet_every_day(self, time_str, tz='UTC', lead=0):
+        self.schedule([{'name': 'daily', 'time': time_str, 'granularity': 'week', 'amount': 4, 'lead': lead}],
+                      tz=tz).run()
+
+    def prepare(self, granularity='week', amount=4, plot_dir='plots/'):
+        return self.prepare_batch([{'granularity': granularity, 'amount': amount}], plot_dir=plot_dir)[0]
+
+    def prepare_batch(self, specs, plot_dir='plots/'):
+        # One fetch and one processed frame for every spec, each spec only slices it, then all charts and all
+        # LLM sections of the batch are rendered and summarised together
+        with self.prepare_lock:
+            with metrics.profiled('prepare'), metrics.timer('pipeline_seconds', stage='prepare'):
+                batch = self.prepare_artifacts(specs, plot_dir=plot_dir)
+            metrics.write_json()
+        return batch
+
+    def prepare_artifacts(self, specs, plot_dir='plots/'):
+        import pandas as pd
+        from llm.payload import compact_payload
+
+        os.makedirs(plot_dir, exist_ok=True)
+        current_time = datetime.now(timezone.utc)
+        formatted_time = current_time.strftime("%Y-%m-%d_%H:%M:%S_%Z")
+        self.logger.info(f"Current time: {formatted_time}")
+
+        # Only the endpoints and series this batch's report, charts and rolling metrics read are fetched and built
+        parts = ['report', 'gpu_plot', 'usd_plot', 'gpu_details_plot']
+        if any(spec.get('prices') for spec in specs):
+            parts.append('gpu_price_plot')
+        endpoints, attrs = resolve(parts, columns=self.rolling.columns if self.rolling is not None else ())
+        with metrics.timer('stage_seconds', stage='fetch'):
+            stale = {}
+            data = self.retriever.retrieve('all', stale=stale, attrs=endpoints)
+        with metrics.timer('stage_seconds', stage='process'):
+            df, gpu_details, market_details, dashboard = self.processor(data, attrs=attrs)
+        with metrics.timer('stage_seconds', stage='report'):
+            rolling = None
+            if self.rolling is not None:
+                rolling = self.rolling.update(df)
+                self.rolling.save()
+            # Only the figures the report itself quotes make it stale
+            stale = {attr: age for attr, age in stale.items() if attr in self.reporter.sources}
+            # X rejects identical tweets, so in a batch every thread names its view in each of its tweets: the GPU
+            # models reply is shared by all threads, and views longer than the history describe the same rows
+            views = [f"{spec['amount']}-{spec['granularity']}" if len(specs) > 1 else None for spec in specs]
+            reports = [self.reporter.generate_report(market_details, dashboard, rolling=rolling, stale=stale,
+                                                     period=view) for view in views]
+        for report in reports:
             self.logger.info(report)
-            tweets = []
-            plot_paths = []
-            # gpu stats
-            samples = self.granularities[granularity] * amount
-            gpu_stats_filepath = os.path.join(plot_dir, f'gpu_{formatted_time}.png')
-            create_gpu_plot(df, granularity=granularity, amount=amount, name=gpu_stats_filepath)
-            gpu_data = df.tail(samples)
-            gpu_data = gpu_data.loc[:, ['date', 'totalGPU', 'activeGPU', 'utilization']]
-            gpu_data['date'] = gpu_data['date'].astype(str)
-            tweet = llm_data_report_request(self.openai_client, gpu_data.to_dict('records'), model=self.model)
-            tweets.append(tweet)
-            plot_paths.append(gpu_stats_filepath)
-            self.logger.info(tweet)
-
-            # GPU model pricing
-            gpu_plot_filepath = os.path.join(plot_dir, f'gpu_details_{formatted_time}.png')
-            create_gpu_availability_and_price_plot(gpu_details, name=gpu_plot_filepath)
-            tweet = llm_data_report_request(self.openai_client, gpu_details.to_dict('records'), model=self.model)
-            tweets.append(tweet)
-            plot_paths.append(gpu_plot_filepath)
-            self.logger.info(tweet)
 
+        # GPU model pricing does not depend on the period, so it is drawn and summarised once per batch
+        gpu_plot_filepath = os.path.join(plot_dir, f'gpu_details_{formatted_time}.png')
+        jobs = [('utils.plot:create_gpu_availability_and_price_plot', (gpu_details,),
+                 dict(name=gpu_plot_filepath, as_of=current_time.date()))]
+        sections = [compact_payload(gpu_details, summary=False)]
+        fallbacks = ['GPU availability and average pricing on Akash']
+        # Per spec the chart paths and, in thread order, either the index of an LLM section or a ready-made text
+        images, plans = [], []
+        for spec in specs:
+            granularity, amount = spec['granularity'], spec['amount']
+            samples = self.granularities[granularity] * amount
+            history = df.tail(samples)
+            period = f'{amount}-{granularity}'
+            gpu_stats_filepath = os.path.join(plot_dir, f'gpu_{period}_{formatted_time}.png')
+            usd_plot_filepath = os.path.join(plot_dir, f'usd_{period}_{formatted_time}.png')
+            jobs.append(('utils.plot:create_gpu_plot', (history,),
+                         dict(granularity=granularity, amount=amount, name=gpu_stats_filepath)))
+            jobs.append(('utils.plot:create_usd_plot', (history,),
+                         dict(granularity=granularity, amount=amount, name=usd_plot_filepath)))
+            # gpu stats
+            sections.append(compact_payload(history.loc[:, ['date', *requirements['gpu_plot']['columns']]],
+                                            rolling=rolling))
+            fallbacks.append(f'Akash GPUs in the last {period} period')
             # USD
-            usd_plot_filepath = os.path.join(plot_dir, f'usd_{formatted_time}.png')
-            create_usd_plot(df, granularity=granularity, amount=amount, name=usd_plot_filepath)
-            usd_data = df.tail(samples)
-            usd_data = usd_data.loc[:, ['date', 'activeLeaseCount', 'activeGPU', 'dailyUsdSpent']]
-            usd_data['date'] = usd_data['date'].astype(str)
-            tweet = llm_data_report_request(self.openai_client, usd_data.to_dict('records'), model=self.model)
-            tweets.append(tweet)
-            plot_paths.append(usd_plot_filepath)
-            self.logger.info(tweet)
-
-            self.post_tweet(report, tweets, plot_paths)
+            sections.append(compact_payload(history.loc[:, ['date', *requirements['usd_plot']['columns']]],
+                                            rolling=rolling))
+            fallbacks.append(f'Active leases, GPUs and daily USD spent in the last {period} period')
+            images.append([gpu_stats_filepath, gpu_plot_filepath, usd_plot_filepath])
+            plans.append([len(sections) - 2, 0, len(sections) - 1])
+
+            index = self.retriever.index
+            if spec.get('prices') and index is not None and len(index.days) > 1:
+                # Price trends come from the GPU market index and need no LLM section
+                price_plot_filepath = os.path.join(plot_dir, f'gpu_prices_{period}_{formatted_time}.png')
+                prices = index.history('price', models=index.top_models(n=6), start=index.days[-1] - samples + 1)
+                jobs.append(('utils.plot:create_gpu_price_trend_plot', (prices,),
+                             dict(granularity=granularity, amount=amount, name=price_plot_filepath)))
+                images[-1].append(price_plot_filepath)
+                plans[-1].append(self.reporter.generate_price_report(index))
+
+        with metrics.timer('stage_seconds', stage='render'):
+            # With the render cache charts come back under their content-hashed names, possibly as WebP
+            rendered = dict(zip([kwargs['name'] for _, _, kwargs in jobs], self.renderer.render(jobs)))
+        images = [[rendered[path] for path in paths] for paths in images]
+        # Every thread gets its own uploads, they run in the background while the LLM writes the descriptions
+        media = [self.publisher.upload(paths) for paths in images]
+        with metrics.timer('stage_seconds', stage='summarise'):
+            texts = asyncio.run(self.summarise(sections, fallbacks))
+        for text in texts:
+            self.logger.info(text)
+
+        # The newest activeGPU date as the API reported it, the same figure data_version compares against. The
+        # frame's last date can lag behind it since it only covers days every built series has
+        try:
+            dates = data['activeGPU'].dates
+            version = pd.Timestamp(dates[-1]) if dates else None
+        except KeyError:
+            version = None
+        return [{'spec': spec, 'report': reports[i],
+                 'tweets': [self.reporter.with_period(texts[tweet] if isinstance(tweet, int) else tweet, views[i])
+                            for tweet in plans[i]],
+                 'final': self.reporter.with_period(self.final_tweet, views[i]),
+                 'images': images[i], 'media': media[i], 'version': version} for i, spec in enumerate(specs)]
+
+    def publish(self, artifacts):
+        with metrics.timer('stage_seconds', stage='post'):
+            self.post_tweet(artifacts['report'], artifacts['tweets'], artifacts['media'], artifacts.get('final'))
+
+    def publish_batch(self, batch):
+        with metrics.profiled('publish'), metrics.timer('pipeline_seconds', stage='publish'):
+            for artifacts in batch:
+                # A thread that fails to post does not take the rest of the batch with it
+                try:
+                    self.publish(artifacts)
+                except Exception:
+                    self.logger.error(f"Posting the {artifacts['spec']['amount']}-{artifacts['spec']['granularity']} "
+                                      f"thread failed\n{traceback.format_exc()}")
+        metrics.write_json()
+
+    def generate(self, granularity='week', amount=4, plot_dir='plots/'):
+        try:
+            self.publish(self.prepare(granularity=granularity, amount=amount, plot_dir=plot_dir))
+        except Exception as e:
+            logger.error(traceback.format_exc())
+
+    def generate_batch(self, specs, plot_dir='plots/'):
+        try:
+            self.publish_batch(self.prepare_batch(specs, plot_dir=plot_dir))
         except Exception as e:
             logger.error(traceback.format_exc())
@@ -0,0 +1,81 @@
+import itertools
+import json
+import threading
+import time
+
+from utils.logger import logger
+
+
+class FakeResponse:
+
+    def __init__(self, data, headers, status_code=200, reason='OK'):
+        self.data = data
+        self.headers = headers
+        self.status_code = status_code
+        self.reason = reason
+
+    def json(self):
+        return {'data': self.data} if self.status_code < 400 else self.data
+
+
+class FakeMedia:
+
+    def __init__(self, media_id):
+        self.media_id = media_id
+        self.media_id_string = str(media_id)
+
+
+class FakeXAPI:
+    # Stand-in for tweepy.API, only media_upload is used by the bot
+
+    def __init__(self, latency=0.5):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.latency = latency
+        self.ids = itertools.count(1000)
+        self.uploads = []
+        self.lock = threading.Lock()
+
+    def media_upload(self, filename, **kwargs):
+        time.sleep(self.latency)
+        with self.lock:
+            media = FakeMedia(next(self.ids))
+            self.uploads.append((filename, media.media_id_string))
+        self.logger.debug(f"Fake upload {filename} -> {media.media_id_string}")
+        return media
+
+
+class FakeXClient:
+    # Stand-in for tweepy.Client(return_type=requests.Response) with a rate limit window in its headers. Like X it
+    # refuses a tweet whose text the account already posted
+
+    def __init__(self, latency=0.3, limit=100, window=900):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.latency = latency
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset = int(time.time()) + window
+        self.ids = itertools.count(1)
+        self.tweets = []
+        self.lock = threading.Lock()
+
+    def create_tweet(self, text=None, media_ids=None, in_reply_to_tweet_id=None, **kwargs):
+        import tweepy
+
+        time.sleep(self.latency)
+        with self.lock:
+            if any(tweet['text'] == text for tweet in self.tweets):
+                raise tweepy.Forbidden(FakeResponse(
+                    {'detail': 'You are not allowed to create a Tweet with duplicate content.'}, {}, 403, 'Forbidden'))
+            if time.time() >= self.reset:
+                self.remaining, self.reset = self.limit, int(time.time()) + self.window
+            self.remaining -= 1
+            tweet = {'id': str(next(self.ids)), 'text': text, 'media_ids': media_ids,
+                     'in_reply_to_tweet_id': in_reply_to_tweet_id}
+            self.tweets.append(tweet)
+            headers = {'x-rate-limit-limit': str(self.limit), 'x-rate-limit-remaining': str(self.remaining),
+                       'x-rate-limit-reset': str(self.reset)}
+        self.logger.debug(f"Fake tweet {json.dumps(tweet)}")
+        return FakeResponse({'id': tweet['id'], 'text': text}, headers)
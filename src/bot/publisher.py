@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from utils.logger import logger
+from utils.metrics import metrics
+
+
+class RateLimiter:
+    # Keeps the x-rate-limit-* headers of the last response per endpoint and only blocks once a window is spent
+
+    def __init__(self, min_interval=0.0):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.min_interval = min_interval
+        self.limits = {}
+        self.last_call = {}
+        self.lock = threading.Lock()
+
+    def update(self, endpoint, headers):
+        if 'x-rate-limit-remaining' not in headers or 'x-rate-limit-reset' not in headers:
+            return False
+        with self.lock:
+            self.limits[endpoint] = (int(headers['x-rate-limit-remaining']), int(headers['x-rate-limit-reset']))
+        return True
+
+    def wait(self, endpoint):
+        with self.lock:
+            remaining, reset = self.limits.get(endpoint, (1, 0))
+            last_call = self.last_call.get(endpoint, 0.0)
+        now = time.time()
+        delay = last_call + self.min_interval - now
+        if remaining <= 0:
+            delay = max(delay, reset - now + 1)
+        if delay > 0:
+            self.logger.info(f"Waiting {delay:.1f}s for the {endpoint} rate limit window")
+            time.sleep(delay)
+        with self.lock:
+            self.last_call[endpoint] = time.time()
+
+
+class ThreadPublisher:
+    # Media goes up in the background as soon as the charts exist, the reply chain is then posted back to back,
+    # pausing only when X reports an exhausted rate limit window
+
+    def __init__(self, x_v1, x_client, upload_workers=4, min_interval=0.0, retries=3):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.x_v1 = x_v1
+        self.x_client = x_client
+        self.limiter = RateLimiter(min_interval=min_interval)
+        self.retries = retries
+        self.executor = ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix='x-upload')
+
+    def call(self, endpoint, function, *args, **kwargs):
+        import tweepy
+
+        for attempt in range(self.retries + 1):
+            self.limiter.wait(endpoint)
+            try:
+                with metrics.timer('x_request_seconds', endpoint=endpoint):
+                    response = function(*args, **kwargs)
+            except tweepy.TooManyRequests as e:
+                metrics.inc('x_rate_limited_total', endpoint=endpoint)
+                if attempt == self.retries:
+                    raise
+                if not self.limiter.update(endpoint, e.response.headers):
+                    # No reset header to go by, back off exponentially instead
+                    time.sleep(2 ** attempt)
+                self.logger.warning(f"Rate limited on {endpoint}, retrying ({attempt + 1}/{self.retries})")
+                continue
+            headers = getattr(response, 'headers', None)
+            if headers is not None:
+                self.limiter.update(endpoint, headers)
+            return response
+
+    def upload_media(self, filepath):
+        media = self.call('media_upload', self.x_v1.media_upload, filepath)
+        media_id = media.media_id_string
+        metrics.inc('x_upload_bytes_total', os.path.getsize(filepath))
+        self.logger.debug(f"Uploaded media {filepath} ID: {media_id}")
+        return media_id
+
+    def upload(self, filepaths):
+        return [self.executor.submit(self.upload_media, filepath) for filepath in filepaths]
+
+    def create_tweet(self, **kwargs):
+        response = self.call('create_tweet', self.x_client.create_tweet, **kwargs)
+        return response.json()['data']['id']
+
+    def post_thread(self, report, tweets, media, final_tweet=None):
+        # media holds upload futures or already known media ids, one per reply. All uploads are done before the
+        # first tweet, a failed one must not leave half a thread behind; they started long before, at prepare time
+        media = [media_id.result() if isinstance(media_id, Future) else media_id for media_id in media]
+        reply_to_tweet_id = self.create_tweet(text=report)
+        self.logger.info(f"First tweet posted with ID: {reply_to_tweet_id}")
+        for tweet, media_id in zip(tweets, media):
+            reply_to_tweet_id = self.create_tweet(text=tweet, media_ids=[media_id],
+                                                  in_reply_to_tweet_id=reply_to_tweet_id)
+            self.logger.info(f"Tweet posted as reply with ID: {reply_to_tweet_id}")
+        if final_tweet:
+            reply_to_tweet_id = self.create_tweet(text=final_tweet, in_reply_to_tweet_id=reply_to_tweet_id)
+            self.logger.info(f"Posted final tweet: {reply_to_tweet_id}")
+        return reply_to_tweet_id
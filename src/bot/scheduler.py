@@ -0,0 +1,106 @@
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+import pytz
+
+from utils.logger import logger
+
+weekdays = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+class Job:
+    # A thread posted at an exact wall-clock time; prepare() runs `lead` seconds earlier and `refresh` seconds before
+    # the slot its artifacts are rebuilt if is_stale() says fresher data arrived in the meantime, so the slot itself
+    # only publishes
+
+    def __init__(self, name, at, prepare, publish, is_stale=None, lead=0, refresh=120, days=None, tz='UTC'):
+        super().__init__()
+        self.name = name
+        self.hour, self.minute = (int(part) for part in at.split(':'))
+        self.prepare = prepare
+        self.publish = publish
+        self.is_stale = is_stale
+        self.lead = timedelta(seconds=lead)
+        self.refresh = timedelta(seconds=min(refresh, lead))
+        self.days = [weekdays.index(day.lower()) for day in days] if days else list(range(7))
+        self.tz = pytz.timezone(tz)
+
+    def next_slot(self, after):
+        local = after.astimezone(self.tz)
+        for offset in range(8):
+            day = (local + timedelta(days=offset)).date()
+            if day.weekday() not in self.days:
+                continue
+            slot = self.tz.localize(datetime(day.year, day.month, day.day, self.hour, self.minute))
+            if slot > after:
+                return slot
+        raise ValueError(f'No upcoming slot for job {self.name}')
+
+
+class Scheduler:
+    # One thread per job sleeping on an event until its next deadline, no polling interval to be late by
+
+    def __init__(self, max_wait=3600):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.jobs = []
+        self.max_wait = max_wait
+        self.stop_event = threading.Event()
+
+    def add(self, job):
+        self.jobs.append(job)
+        return job
+
+    def wait_until(self, moment):
+        # Sleep in bounded steps so the wall clock is re-read and adjustments do not shift the deadline
+        while not self.stop_event.is_set():
+            remaining = (moment - datetime.now(pytz.utc)).total_seconds()
+            if remaining <= 0:
+                return True
+            self.stop_event.wait(min(remaining, self.max_wait))
+        return False
+
+    def prepare(self, job):
+        try:
+            return job.prepare()
+        except Exception:
+            self.logger.error(f"Preparing {job.name} failed\n{traceback.format_exc()}")
+
+    def run_job(self, job):
+        while not self.stop_event.is_set():
+            slot = job.next_slot(datetime.now(pytz.utc))
+            self.logger.info(f"Next {job.name} thread at {slot.isoformat()}, "
+                             f"preparing from {(slot - job.lead).isoformat()}")
+            if not self.wait_until(slot - job.lead):
+                return
+            artifacts = self.prepare(job)
+            if not self.wait_until(slot - job.refresh):
+                return
+            try:
+                if artifacts is None or (job.is_stale is not None and job.is_stale(artifacts)):
+                    self.logger.info(f"Artifacts of {job.name} are missing or stale, preparing again")
+                    artifacts = self.prepare(job)
+            except Exception:
+                self.logger.error(f"Checking {job.name} for fresher data failed\n{traceback.format_exc()}")
+            if not self.wait_until(slot):
+                return
+            try:
+                if artifacts is not None:
+                    job.publish(artifacts)
+            except Exception:
+                self.logger.error(f"Publishing {job.name} failed\n{traceback.format_exc()}")
+            # Never fire twice for the same slot, even if publishing took no time at all
+            self.wait_until(slot + timedelta(seconds=1))
+
+    def run(self):
+        self.logger.info(f"Starting Akash bot scheduler with {len(self.jobs)} jobs")
+        threads = [threading.Thread(target=self.run_job, args=(job,), name=f'job-{job.name}', daemon=True)
+                   for job in self.jobs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,52 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from llm.prompt import system_prompt, user_prompt
+
+
+def cache_key(model, data, char_limit=280):
+    # The prompt templates are part of the key, so editing llm/prompt.py invalidates earlier answers
+    content = json.dumps({'model': model, 'system': system_prompt(), 'user': user_prompt('{data}'),
+                          'data': data, 'char_limit': char_limit}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    # Content-addressed LLM answers with a TTL, the least recently used entries go first once max_entries is hit
+
+    def __init__(self, path='data/llm_cache.db', ttl=24 * 3600, max_entries=256):
+        super().__init__()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS responses ('
+                                    'key TEXT PRIMARY KEY, text TEXT NOT NULL, '
+                                    'created_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+
+    def get(self, key):
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute('SELECT text FROM responses WHERE key = ? AND created_at > ?',
+                                          (key, now - self.ttl)).fetchone()
+            if row is not None:
+                self.connection.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+        return row[0] if row else None
+
+    def put(self, key, text):
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO responses (key, text, created_at, accessed_at) '
+                                    'VALUES (?, ?, ?, ?)', (key, text, now, now))
+            self.connection.execute('DELETE FROM responses WHERE created_at <= ?', (now - self.ttl,))
+            self.connection.execute('DELETE FROM responses WHERE key NOT IN '
+                                    '(SELECT key FROM responses ORDER BY accessed_at DESC LIMIT ?)',
+                                    (self.max_entries,))
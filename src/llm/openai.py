@@ -1,37 +1,124 @@
+import asyncio
 import json
+import time
 
-from bs4 import BeautifulSoup
-
+from llm.cache import cache_key
 from llm.prompt import system_prompt, user_prompt
+from llm.stream import TagFilter, weighted_length, weighted_prefix
+from utils.logger import logger
+from utils.metrics import metrics
+
+
+def report_messages(data):
+    messages = [
+        {"role": "system",
+         "content": system_prompt()},
+        {"role": "user",
+         "content": user_prompt(json.dumps(data, separators=(',', ':')))},
+    ]
+    metrics.inc('llm_prompt_bytes_total', sum(len(message['content'].encode('utf-8')) for message in messages))
+    return messages
+
+
+def count_usage(usage):
+    if usage is not None:
+        metrics.inc('llm_tokens_total', usage.prompt_tokens or 0, kind='prompt')
+        metrics.inc('llm_tokens_total', usage.completion_tokens or 0, kind='completion')
 
 
 def llm_data_report_request(client, data:dict, model='DeepSeek-R1', char_limit=280):
 
-    response = client.chat.completions.create(
+    with metrics.timer('llm_request_seconds', model=model, stream=False):
+        response = client.chat.completions.create(
+            model=model,
+            messages=report_messages(data)
+        )
+    count_usage(response.usage)
+    return clean_report(response.choices[0].message.content, char_limit)
+
+
+async def async_llm_data_report_request(client, data:dict, model='DeepSeek-R1', char_limit=280):
+
+    with metrics.timer('llm_request_seconds', model=model, stream=False):
+        response = await client.chat.completions.create(
+            model=model,
+            messages=report_messages(data)
+        )
+    count_usage(response.usage)
+    return clean_report(response.choices[0].message.content, char_limit)
+
+
+async def async_llm_data_report_stream(client, data:dict, model='DeepSeek-R1', char_limit=280):
+    # Reasoning segments are dropped as they stream in and generation stops as soon as the visible text
+    # overflows the budget, the overflow is only needed to find the last complete sentence.
+    # Usage is not reported for a stream that is cut short, so every content chunk counts as one completion token
+    start = time.perf_counter()
+    stream = await client.chat.completions.create(
         model=model,
-        messages=[
-            {"role": "system",
-             "content": system_prompt()},
-            {"role": "user",
-             "content": user_prompt(json.dumps(data))},
-        ]
+        messages=report_messages(data),
+        stream=True
     )
-    text = response.choices[0].message.content
-    if '<think>' in text:
+    tag_filter = TagFilter('think')
+    text = ''
+    chunks = 0
+    try:
+        async for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            if chunks == 0:
+                metrics.observe('llm_first_token_seconds', time.perf_counter() - start, model=model)
+            chunks += 1
+            text += tag_filter.feed(chunk.choices[0].delta.content)
+            if weighted_length(text.lstrip()) > char_limit:
+                break
+        else:
+            text += tag_filter.flush()
+    finally:
+        await stream.close()
+        metrics.inc('llm_tokens_total', chunks, kind='streamed')
+        metrics.observe('llm_request_seconds', time.perf_counter() - start, model=model, stream=True)
+    return limit_text(text.lstrip(), char_limit).strip()
+
+
+async def summarise_sections(client, sections, fallbacks, model='DeepSeek-R1', char_limit=280, timeout=120,
+                             max_concurrency=3, stream=True, cache=None):
+    # All sections are requested at once, a section that fails or times out gets its fallback text instead
+    semaphore = asyncio.Semaphore(max_concurrency)
+    request = async_llm_data_report_stream if stream else async_llm_data_report_request
+
+    async def summarise(data, fallback):
+        key = cache_key(model, data, char_limit) if cache is not None else None
+        if key is not None and (text := cache.get(key)) is not None:
+            logger.debug(f"LLM summary served from cache {key[:12]}")
+            metrics.inc('llm_cache_hits_total')
+            return text
+        async with semaphore:
+            try:
+                text = await asyncio.wait_for(request(client, data, model=model, char_limit=char_limit), timeout)
+                if key is not None and text:
+                    cache.put(key, text)
+                return text
+            except Exception as e:
+                logger.warning(f"LLM summary failed, using fallback text: {e!r}")
+                metrics.inc('llm_fallbacks_total')
+                return fallback
+
+    return await asyncio.gather(*(summarise(data, fallback) for data, fallback in zip(sections, fallbacks)))
+
+
+def clean_report(text, char_limit=280):
+    if 'think>' in text:
         text = remove_tag_segment(text, 'think')
     text = limit_text(text, char_limit)
     return text.strip()
 
 def remove_tag_segment(text, tag='think'):
-    soup = BeautifulSoup(text, 'html.parser')
-    for tag in soup.find_all(tag):
-        tag.decompose()
-    text = soup.get_text()
-    return text
+    tag_filter = TagFilter(tag)
+    return tag_filter.feed(text) + tag_filter.flush()
 
 def limit_text(text, limit):
-    if len(text) > limit:
-        text = text[:limit]
+    if weighted_length(text) > limit:
+        text = weighted_prefix(text, limit)
         segments = text.split('. ')
         text = '. '.join(segments[:-1])
     return text
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+
+def round_significant(values, digits=4):
+    values = np.asarray(values, dtype=np.float64)
+    magnitude = np.floor(np.log10(np.abs(np.where(values == 0, 1, values))))
+    factor = 10.0 ** (digits - 1 - magnitude)
+    return np.round(values * factor) / factor
+
+
+def compact_payload(df, digits=4, summary=True, rolling=None):
+    # Columnar layout with rounded numbers instead of one verbose dict per row, plus a few summary statistics
+    # and the precomputed rolling metrics so the model does not have to derive the trend from raw rows
+    columns = {}
+    stats = {}
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            columns[column] = series.dt.strftime('%Y-%m-%d').tolist()
+        elif pd.api.types.is_float_dtype(series):
+            columns[column] = [None if np.isnan(value) else value
+                               for value in round_significant(series.to_numpy(), digits).tolist()]
+        elif pd.api.types.is_numeric_dtype(series):
+            columns[column] = series.astype(np.int64).tolist()
+        else:
+            columns[column] = series.astype(str).tolist()
+        if summary and pd.api.types.is_numeric_dtype(series) and series.notna().sum() > 1:
+            values = series.dropna().to_numpy(dtype=np.float64)
+            first, last = values[0], values[-1]
+            change = (last - first) / abs(first) * 100 if first else np.nan
+            rounded = round_significant([first, last, values.min(), values.max(), values.mean(), change], digits)
+            stats[column] = {name: None if np.isnan(value) else value for name, value in
+                             zip(['first', 'last', 'min', 'max', 'mean', 'change_pct'], rounded.tolist())}
+    payload = {'columns': columns}
+    if stats:
+        payload['summary'] = stats
+    if rolling:
+        payload['rolling'] = {column: rolling_metrics(rolling[column], digits) for column in df.columns
+                              if column in rolling}
+    return payload
+
+
+def rolling_metrics(values, digits=4):
+    # Keeps the latest moving averages, changes and anomaly flag, rounded like the columns
+    return {name: round_significant([value], digits).tolist()[0] if isinstance(value, float) else value
+            for name, value in values.items() if name not in ('date', 'value')}
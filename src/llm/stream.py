@@ -0,0 +1,83 @@
+import re
+
+# X counts most Latin, punctuation and general symbols as 1 and everything else (CJK, emoji, ...) as 2,
+# URLs always count as 23 whatever their length
+light_ranges = ((0, 4351), (8192, 8205), (8208, 8223), (8242, 8247))
+url_length = 23
+url_pattern = re.compile(r'https?://\S+')
+
+
+def char_weight(char):
+    code = ord(char)
+    return 1 if any(start <= code <= end for start, end in light_ranges) else 2
+
+
+def weighted_length(text):
+    length = 0
+    position = 0
+    for match in url_pattern.finditer(text):
+        length += sum(char_weight(char) for char in text[position:match.start()]) + url_length
+        position = match.end()
+    return length + sum(char_weight(char) for char in text[position:])
+
+
+def weighted_prefix(text, limit):
+    length = 0
+    for i, char in enumerate(text):
+        length += char_weight(char)
+        if length > limit:
+            return text[:i]
+    return text
+
+
+class TagFilter:
+    # Drops <tag>...</tag> segments from a token stream as it arrives, holding back only as many characters as
+    # could be the start of a marker split across two chunks
+
+    def __init__(self, tag='think'):
+        super().__init__()
+        self.open_marker = f'<{tag}>'
+        self.close_marker = f'</{tag}>'
+        self.inside = False
+        self.buffer = ''
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        visible = []
+        while True:
+            if self.inside:
+                index = self.buffer.find(self.close_marker)
+                if index >= 0:
+                    self.buffer = self.buffer[index + len(self.close_marker):]
+                    self.inside = False
+                    continue
+                keep = partial_marker(self.buffer, self.close_marker)
+                self.buffer = self.buffer[len(self.buffer) - keep:]
+                return ''.join(visible)
+            # Outside a segment a stray closing marker is dropped as well
+            opening, closing = self.buffer.find(self.open_marker), self.buffer.find(self.close_marker)
+            if opening >= 0 and (closing < 0 or opening < closing):
+                visible.append(self.buffer[:opening])
+                self.buffer = self.buffer[opening + len(self.open_marker):]
+                self.inside = True
+                continue
+            if closing >= 0:
+                visible.append(self.buffer[:closing])
+                self.buffer = self.buffer[closing + len(self.close_marker):]
+                continue
+            keep = max(partial_marker(self.buffer, self.open_marker), partial_marker(self.buffer, self.close_marker))
+            visible.append(self.buffer[:len(self.buffer) - keep])
+            self.buffer = self.buffer[len(self.buffer) - keep:]
+            return ''.join(visible)
+
+    def flush(self):
+        text = '' if self.inside else self.buffer
+        self.buffer = ''
+        return text
+
+
+def partial_marker(text, marker):
+    for size in range(min(len(marker) - 1, len(text)), 0, -1):
+        if text.endswith(marker[:size]):
+            return size
+    return 0
@@ -0,0 +1,133 @@
+import json
+import os
+from array import array
+from datetime import datetime, timezone
+
+from utils.logger import logger
+from utils.schema import Series, decode
+
+
+def require_pyarrow():
+    # pyarrow is only needed when the archive is switched on, so it is not a dependency of the bot itself
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+    except ImportError as e:
+        raise ImportError('The snapshot archive needs pyarrow, install it with '
+                          '`poetry install --extras archive`') from e
+    return pyarrow
+
+
+class SnapshotArchive:
+    # One partition per UTC day (day=YYYY-MM-DD) with two Arrow IPC files: series.arrow holds every graph-data
+    # series column-wise (attr, date, value) and documents.arrow the raw bodies of the other endpoints.
+    # Files are read through a memory map, with compression=None the columns are used in place without a copy
+
+    date_format = '%Y-%m-%dT%H:%M:%SZ'  # milliseconds are part of %S for timestamp[ms]
+
+    def __init__(self, directory='data/archive', compression='zstd'):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.directory = directory
+        self.compression = compression
+
+    def partition(self, day):
+        return os.path.join(self.directory, f'day={day}')
+
+    def days(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[len('day='):] for name in os.listdir(self.directory) if name.startswith('day='))
+
+    def write(self, data, bodies, day=None):
+        # data is a retrieve() result and bodies the raw responses it was decoded from, a later fetch on the same
+        # day replaces the attrs it contains and keeps the rest of the partition
+        pa = require_pyarrow()
+        import numpy as np
+
+        day = day or datetime.now(timezone.utc).date().isoformat()
+        series = {attr: value for attr, value in data.items() if isinstance(value, Series)}
+        documents = {attr: bodies[attr] for attr in data if attr not in series and attr in bodies}
+        values = array('d')
+        for value in series.values():
+            values.extend(value.values)
+        series_table = pa.table({
+            'attr': pa.array([attr for attr, value in series.items() for _ in value.dates], pa.string()),
+            'date': pa.array([date for value in series.values() for date in value.dates],
+                             pa.string()).cast(pa.timestamp('ms', tz='UTC')),
+            'value': pa.array(np.frombuffer(values, dtype=np.float64) if values else [], pa.float64())})
+        current = {attr: [value.current_value, value.compare_value] for attr, value in series.items()}
+        documents_table = pa.table({'attr': pa.array(list(documents), pa.string()),
+                                    'body': pa.array(list(documents.values()), pa.binary())})
+
+        directory = self.partition(day)
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, 'series.arrow')):
+            previous = self.table(day, 'series')
+            current = {**json.loads(previous.schema.metadata[b'current']), **current}
+            kept = pa.compute.invert(pa.compute.is_in(previous['attr'], value_set=series_table['attr']))
+            series_table = pa.concat_tables([previous.filter(kept).replace_schema_metadata(None), series_table])
+        if os.path.exists(os.path.join(directory, 'documents.arrow')):
+            previous = self.table(day, 'documents')
+            kept = pa.compute.invert(pa.compute.is_in(previous['attr'], value_set=documents_table['attr']))
+            documents_table = pa.concat_tables([previous.filter(kept), documents_table])
+        self.write_table(os.path.join(directory, 'series.arrow'),
+                         series_table.replace_schema_metadata({'current': json.dumps(current)}))
+        self.write_table(os.path.join(directory, 'documents.arrow'), documents_table)
+        self.logger.debug(f"Archived {len(series)} series and {len(documents)} documents for {day}")
+        return directory
+
+    def write_table(self, path, table):
+        pa = require_pyarrow()
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        tmp_path = f'{path}.tmp'
+        with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, path)
+
+    def table(self, day, name='series'):
+        pa = require_pyarrow()
+        return pa.ipc.open_file(pa.memory_map(os.path.join(self.partition(day), f'{name}.arrow'), 'r')).read_all()
+
+    def scan(self, start=None, end=None, attrs=None):
+        # Every archived series between two days (inclusive) as one table with an extra day column
+        pa = require_pyarrow()
+        tables = []
+        for day in self.days():
+            if (start and day < start) or (end and day > end):
+                continue
+            table = self.table(day, 'series').replace_schema_metadata(None)
+            if attrs is not None:
+                table = table.filter(pa.compute.is_in(table['attr'], value_set=pa.array(attrs, pa.string())))
+            tables.append(table.append_column('day', pa.array([day] * len(table), pa.string()).cast(pa.date32())))
+        return pa.concat_tables(tables) if tables else None
+
+    def series(self, day):
+        pa = require_pyarrow()
+        table = self.table(day, 'series')
+        series = {}
+        for attr, (current_value, compare_value) in json.loads(table.schema.metadata[b'current']).items():
+            rows = table.filter(pa.compute.equal(table['attr'], attr))
+            dates = pa.compute.strftime(rows['date'], format=self.date_format).to_pylist()
+            series[attr] = Series(current_value, compare_value, dates, array('d', rows['value'].to_numpy().tobytes()))
+        return series
+
+    def documents(self, day):
+        table = self.table(day, 'documents')
+        return dict(zip(table['attr'].to_pylist(), table['body'].to_pylist()))
+
+    def read(self, day=None):
+        # The archived day in the typed form retrieve('all') returns
+        day = day or self.days()[-1]
+        return {**self.series(day), **{attr: decode(attr, body) for attr, body in self.documents(day).items()}}
+
+    def payloads(self, day=None):
+        # The archived day shaped like the API responses, for replaying it through a fixture server
+        day = day or self.days()[-1]
+        payloads = {attr: {'currentValue': series.current_value, 'compareValue': series.compare_value,
+                           'snapshots': [{'date': date, 'value': int(value) if value.is_integer() else value}
+                                         for date, value in zip(series.dates, series.values)]}
+                    for attr, series in self.series(day).items()}
+        payloads.update({attr: json.loads(body) for attr, body in self.documents(day).items()})
+        return payloads
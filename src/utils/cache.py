@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from utils.logger import logger
+
+
+class CacheEntry:
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+
+    @property
+    def age(self):
+        return time.time() - self.meta['fetched_at']
+
+    def validators(self):
+        headers = {}
+        if self.meta.get('etag'):
+            headers['If-None-Match'] = self.meta['etag']
+        if self.meta.get('last_modified'):
+            headers['If-Modified-Since'] = self.meta['last_modified']
+        return headers
+
+    def body(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def json(self):
+        return json.loads(self.body())
+
+
+class HTTPCache:
+    # On-disk response cache: one body file plus a small metadata file per URL, evicted least-recently-used first
+
+    def __init__(self, directory='data/http_cache', max_bytes=256 * 1024 * 1024, default_ttl=900, ttls=None):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def ttl(self, attr):
+        return self.ttls.get(attr, self.default_ttl)
+
+    def paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{key}.body'), os.path.join(self.directory, f'{key}.meta')
+
+    def get(self, url):
+        body_path, meta_path = self.paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            os.utime(body_path)  # mark as recently used for eviction
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return CacheEntry(body_path, meta)
+
+    def put(self, url, response):
+        body_path, meta_path = self.paths(url)
+        meta = {'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched_at': time.time(),
+                'size': len(response.content)}
+        self.write(body_path, response.content)
+        self.write(meta_path, json.dumps(meta).encode('utf-8'))
+        self.evict()
+        return CacheEntry(body_path, meta)
+
+    def revalidate(self, url, entry):
+        # The server answered 304 Not Modified, so the stored body is fresh again
+        entry.meta['fetched_at'] = time.time()
+        self.write(self.paths(url)[1], json.dumps(entry.meta).encode('utf-8'))
+        return entry
+
+    @staticmethod
+    def write(path, content):
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        with self.lock:
+            bodies = []
+            for name in os.listdir(self.directory):
+                if name.endswith('.body'):
+                    path = os.path.join(self.directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    bodies.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in bodies)
+            for _, size, path in sorted(bodies):
+                if total <= self.max_bytes:
+                    break
+                for stale_path in (path, f'{path[:-len(".body")]}.meta'):
+                    try:
+                        os.remove(stale_path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+                self.logger.debug(f"Evicted {path} ({size} bytes)")
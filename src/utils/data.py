@@ -1,13 +1,24 @@
-import json
-import pickle
 from abc import ABC, abstractmethod
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
 
-import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from utils.logger import logger
+from utils.archive import SnapshotArchive
+from utils.cache import HTTPCache
+from utils.metrics import metrics
+from utils.resilience import CircuitBreaker, LatencyTracker
+from utils.schema import Dashboard, NetworkStats, decode
+from utils.store import SnapshotStore
 from configs import settings
 
+# Daily snapshots per reporting period
+granularities = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+
 
 class Retriever(ABC):
 
@@ -19,38 +30,264 @@ class Retriever(ABC):
         pass
 
 
+class LazyData(dict):
+    # A retrieve('all') result limited to some endpoints, the others are retrieved the first time they are read.
+    # Endpoints the retrieve already tried and had to leave out stay missing
+
+    def __init__(self, retriever, data, attempted=()):
+        super().__init__(data)
+        self.retriever = retriever
+        self.attempted = set(attempted)
+
+    def __missing__(self, attr):
+        if attr not in self.retriever.attr2url or attr in self.attempted:
+            raise KeyError(attr)
+        self[attr] = value = self.retriever.load(attr)
+        return value
+
+    def load(self, attrs):
+        # Makes sure the store has today's values of some series, reading the ones it lacks. Series the retrieve
+        # already tried fell back to what the store has
+        for attr in attrs:
+            if attr not in self and attr not in self.attempted and not self.retriever.is_synced(attr):
+                self[attr]
+
+
 class AkashStatsRetriever(Retriever):
+    provider_series = ['cpu', 'gpu', 'memory', 'storage', 'count']
+    graph_series = ['activeLeaseCount', 'totalLeaseCount', 'dailyLeaseCount', 'totalUAktSpent', 'dailyUAktSpent',
+                    'totalUUsdcSpent', 'dailyUUsdcSpent', 'totalUUsdSpent', 'dailyUUsdSpent', 'activeCPU', 'activeGPU',
+                    'activeMemory', 'activeStorage']
 
-    def __init__(self, console_server, cloudmos_server):
+    def __init__(self, console_server, cloudmos_server, max_workers=8, timeout=15, timeouts=None, retries=3,
+                 backoff_factor=0.5, store_path=None, store_max_age=6 * 3600, cache=None, archive=None,
+                 index_path=None, deadline=None, hedge=None, breaker=None):
         super().__init__()
         self.console_server = console_server
         self.cloudmos_server = cloudmos_server
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.timeouts = dict(timeouts or {})
+        self.deadline = deadline
+        # Hedged duplicates need their own threads and connections next to the fetch workers
+        self.latency = LatencyTracker(**hedge) if hedge else None
+        self.hedge_executor = ThreadPoolExecutor(max_workers=max_workers,
+                                                 thread_name_prefix='akash-hedge') if hedge else None
+        self.breaker = CircuitBreaker(**breaker) if breaker else None
+        self.session = self.create_session(max_workers * 2 if hedge else max_workers, retries, backoff_factor)
+        self.store = SnapshotStore(store_path) if store_path else None
+        self.store_max_age = store_max_age
+        self.cache = HTTPCache(**cache) if cache else None
+        self.archive = SnapshotArchive(**archive) if archive else None
+        self.index = None
+        if index_path:
+            from utils.market import GpuMarketIndex
+            self.index = GpuMarketIndex(index_path)
         self.attr2url = {'dashboard': os.path.join(self.console_server, 'dashboard-data'),
                          'market': os.path.join(self.console_server, 'market-data'),
                          }
         self.attr2url.update({attr: os.path.join(self.console_server, 'provider-graph-data', attr) for attr in
-                              ['cpu', 'gpu', 'memory', 'storage', 'count']})
+                              self.provider_series})
         self.attr2url.update({'gpu_details': os.path.join(self.console_server, 'gpu')})
         self.attr2url.update({'gpu_prices': os.path.join(self.cloudmos_server, 'gpu-prices')})
         self.attr2url.update({attr: os.path.join(self.console_server, 'graph-data', attr) for attr in
-                              ['activeLeaseCount', 'totalLeaseCount', 'dailyLeaseCount', 'totalUAktSpent',
-                               'dailyUAktSpent',
-                               'totalUUsdcSpent', 'dailyUUsdcSpent', 'totalUUsdSpent', 'dailyUUsdSpent', 'activeCPU',
-                               'activeGPU',
-                               'activeMemory', 'activeStorage']})
+                              self.graph_series})
+
+    @staticmethod
+    def create_session(pool_size, retries, backoff_factor):
+        # One keep-alive pool shared by every endpoint, sized to the number of concurrent workers
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=('GET',), respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def fetch(self, attr, revalidate=False):
+        return self.fetch_value(attr, revalidate=revalidate)[1]
+
+    def fetch_body(self, attr, revalidate=False):
+        return self.fetch_value(attr, revalidate=revalidate)[0]
+
+    @staticmethod
+    def decode(attr, body):
+        with metrics.timer('decode_seconds', endpoint=attr):
+            return decode(attr, body)
+
+    def fetch_value(self, attr, revalidate=False, ticket=None):
+        # The body and its decoded value. A body that does not decode fails like an error response and is never
+        # cached, so the last good one stays there to fall back to
+        url = self.attr2url[attr]
+        entry = self.cache.get(url) if self.cache else None
+        if entry is not None and not revalidate and entry.age < self.cache.ttl(attr):
+            metrics.inc('fetch_cache_total', endpoint=attr, result='hit')
+            body = entry.body()
+            return body, self.decode(attr, body)
+
+        headers = entry.validators() if entry is not None else {}
+        if self.breaker is not None:
+            self.breaker.before(attr)
+        try:
+            with metrics.timer('fetch_seconds', endpoint=attr):
+                response = self.request(attr, url, headers)
+            if response.status_code != 304:
+                response.raise_for_status()
+            body = entry.body() if response.status_code == 304 and entry is not None else response.content
+            value = self.decode(attr, body)
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.record(attr, False, ticket)
+            raise
+        if self.breaker is not None:
+            self.breaker.record(attr, True, ticket)
+        if response.status_code == 304 and entry is not None:
+            metrics.inc('fetch_cache_total', endpoint=attr, result='revalidated')
+            self.cache.revalidate(url, entry)
+            return body, value
+        metrics.inc('fetch_cache_total', endpoint=attr, result='miss')
+        metrics.inc('fetch_bytes_total', len(body), endpoint=attr)
+        if self.cache:
+            self.cache.put(url, response)
+        return body, value
+
+    def request(self, attr, url, headers):
+        # Once a request outlives the endpoint's p95 an identical one is sent next to it and the first good
+        # answer wins, so one slow connection does not hold up the whole fetch
+        timeout = self.timeouts.get(attr, self.timeout)
+        budget = self.latency.budget(attr) if self.latency is not None else None
+        if budget is None or budget >= timeout:
+            start = time.perf_counter()
+            response = self.session.get(url, headers=headers, timeout=timeout)
+            if self.latency is not None and response.ok:
+                self.latency.record(attr, time.perf_counter() - start)
+            return response
+
+        start = time.perf_counter()
+        pending = {self.hedge_executor.submit(self.session.get, url, headers=headers, timeout=timeout)}
+        if not wait(pending, timeout=budget).done:
+            metrics.inc('fetch_hedged_total', endpoint=attr)
+            logger.debug(f"{attr} is slower than its {budget:.2f}s budget, sending a hedged request")
+            pending.add(self.hedge_executor.submit(self.session.get, url, headers=headers, timeout=timeout))
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                if future.result().ok:
+                    self.latency.record(attr, time.perf_counter() - start)
+                return future.result()
+        raise error
+
+    def fetch_values(self, attrs, concurrent=True, stale=None):
+        # Bodies and decoded values of some endpoints. Endpoints that fail, send a body that does not decode, have
+        # an open circuit or miss the deadline fall back to their last good response, whose age goes into `stale`;
+        # the fetch as a whole never waits longer than the deadline
+        results, errors = {}, {}
+        if not concurrent:
+            for attr in attrs:
+                try:
+                    results[attr] = self.fetch_value(attr)
+                except Exception as e:
+                    errors[attr] = e
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='akash-fetch')
+            tickets = {attr: {} for attr in attrs}
+            futures = {attr: executor.submit(self.fetch_value, attr, ticket=tickets[attr]) for attr in attrs}
+            wait(futures.values(), timeout=self.deadline)
+            # Late requests are left to finish in the background, nothing waits for them any more
+            executor.shutdown(wait=False, cancel_futures=True)
+            for attr, future in futures.items():
+                if not future.done() or future.cancelled():
+                    errors[attr] = TimeoutError(f'no response within the {self.deadline}s deadline')
+                    # Missing the deadline counts against the endpoint even though its request is still running,
+                    # whatever that request ends with later is not counted again
+                    if self.breaker is not None:
+                        self.breaker.record(attr, False, tickets[attr])
+                elif future.exception() is not None:
+                    errors[attr] = future.exception()
+                else:
+                    results[attr] = future.result()
+
+        for attr, error in errors.items():
+            body, age = self.last_known_good(attr)
+            if age is None:
+                logger.error(f"Could not retrieve {attr} and there is no earlier response to fall back to: {error}")
+                continue
+            logger.warning(f"Could not retrieve {attr}, falling back to data from {age / 3600:.1f}h ago: {error}")
+            metrics.inc('fetch_fallback_total', endpoint=attr, error=type(error).__name__)
+            if stale is not None:
+                stale[attr] = age
+            if body is not None:
+                results[attr] = (body, self.decode(attr, body))
+        if self.latency is not None:
+            self.latency.save()
+        bodies = {attr: body for attr, (body, _) in results.items()}
+        return bodies, {attr: value for attr, (_, value) in results.items()}
+
+    def last_known_good(self, attr):
+        # The cached response regardless of its TTL, or for a stored series just the age of the store, the
+        # processor reads its history from there anyway. (None, None) when there is nothing to fall back to
+        entry = self.cache.get(self.attr2url[attr]) if self.cache else None
+        if entry is not None:
+            return entry.body(), entry.age
+        synced_at = self.store.synced_at(attr) if self.store is not None else None
+        if synced_at is not None and attr in self.provider_series + self.graph_series:
+            return None, (datetime.now(timezone.utc) - synced_at).total_seconds()
+        return None, None
+
+    def fetch_all(self, attrs, concurrent=True):
+        return self.fetch_values(attrs, concurrent)[1]
+
+    def is_synced(self, attr):
+        return (self.store is not None and attr in self.provider_series + self.graph_series and
+                self.store.is_current(attr, self.store_max_age))
 
-    def retrieve(self, query, save_to_json=False):
+    def sync(self, data):
+        if self.index is not None and 'gpu_prices' in data:
+            self.index.record(datetime.now(timezone.utc).date(), data['gpu_prices'])
+            self.index.save()
+        if self.store is None:
+            return
+        for attr in self.provider_series + self.graph_series:
+            if attr in data:
+                self.store.merge(attr, data[attr])
+
+    def load(self, attr):
+        # A single endpoint outside the retrieved ones, stored like the rest
+        if self.is_synced(attr):
+            return self.store.snapshots([attr])[attr]
+        value = self.fetch(attr)
+        self.sync({attr: value})
+        return value
+
+    def archive_day(self, data, bodies):
+        if self.archive is None:
+            return
+        try:
+            self.archive.write(data, bodies)
+        except Exception as e:
+            logger.warning(f"Could not archive today's fetch: {e!r}")
+
+    def retrieve(self, query, concurrent=True, stale=None, attrs=None):
+        # attrs limits 'all' to the endpoints a thread needs (see utils.requirements), the rest load lazily
         data = {}
         try:
             if query == 'all':
-                for attr, url in self.attr2url.items():
-                    data[attr] = requests.get(url).json()
-                    if save_to_json:
-                        with open(f'data/{attr}.json', 'w', encoding='utf-8') as f:
-                            json.dump(data[attr], f, ensure_ascii=False, indent=4)
-                return data
+                attrs = [attr for attr in (attrs or self.attr2url) if not self.is_synced(attr)]
+                fallbacks = {}
+                bodies, data = self.fetch_values(attrs, concurrent=concurrent, stale=fallbacks)
+                # Fallback responses are old news, only fresh ones go into the store, index and archive
+                fresh = {attr: value for attr, value in data.items() if attr not in fallbacks}
+                self.sync(fresh)
+                self.archive_day(fresh, bodies)
+                if stale is not None:
+                    stale.update(fallbacks)
+                return LazyData(self, data, attempted=attrs)
             elif query in self.attr2url:
-                data[query] = requests.get(self.attr2url[query]).json()
+                data[query] = self.fetch(query)
                 return data
             else:
                 raise ValueError(f'Unknown query {query}')
@@ -64,76 +301,134 @@ class AkashStatsProcessor:
              'totalUUsdcSpent', 'dailyUUsdcSpent', 'totalUUsdSpent', 'dailyUUsdSpent', 'activeCPU',
              'activeGPU',
              'activeMemory', 'activeStorage', 'cpu', 'gpu', 'memory', 'storage', 'count']
+    renames = {'totalUUsdSpent': 'totalUsdSpent',
+               'totalUAktSpent': 'totalAktSpent',
+               'dailyUAktSpent': 'dailyAktSpent',
+               'dailyUUsdSpent': 'dailyUsdSpent',
+               'gpu': 'totalGPU',
+               'cpu': 'totalCPU',
+               'memory': 'totalMemory',
+               'storage': 'totalStorage'}
+    micro_units = ['totalUUsdSpent', 'totalUAktSpent', 'dailyUAktSpent', 'dailyUUsdSpent']
+    int32_attrs = ['activeLeaseCount', 'totalLeaseCount', 'dailyLeaseCount', 'activeGPU', 'gpu', 'count']
 
-    def __init__(self):
+    def __init__(self, store=None):
         super().__init__()
+        self.store = store
 
-    def __call__(self, data):
-        dfs = []
-        for attr in self.attrs:
-            df = pd.DataFrame(data[attr]["snapshots"])
-            df["date"] = pd.to_datetime(df["date"])
-            df.set_index("date", inplace=True)
-            df.columns = [attr]
-            dfs.append(df)
-
-        df = pd.concat(dfs, join="inner", axis=1)
-        df = df.reset_index()
-
-        df.rename(columns={'totalUUsdSpent': 'totalUsdSpent',
-                           'totalUAktSpent': 'totalAktSpent',
-                           'dailyUAktSpent': 'dailyAktSpent',
-                           'dailyUUsdSpent': 'dailyUsdSpent',
-                           'gpu': 'totalGPU',
-                           'cpu': 'totalCPU',
-                           'memory': 'totalMemory',
-                           'storage': 'totalStorage'}, inplace=True)
-        df['utilization'] = df['activeGPU'] / df['totalGPU']
-        df['totalUsdSpent'] = df['totalUsdSpent'] / 1000000
-        df['totalAktSpent'] = df['totalAktSpent'] / 1000000
-        df['dailyAktSpent'] = df['dailyAktSpent'] / 1000000
-        df['dailyUsdSpent'] = df['dailyUsdSpent'] / 1000000
-
-        gpu_data = []
-        other_total = 0
-        other_available = 0
-        other_prices = []
-
-        for model in data['gpu_prices']["models"]:
-            model_name = f"{model['model']} {model['ram']} {model['interface']}"
-            total = model["availability"]["total"]
-            available = model["availability"]["available"]
-            price = model["price"]["avg"] if model["price"] else None
-
-            if total > 10:
-                gpu_data.append((model_name, total, available, price))
-            else:
-                other_total += total
-                other_available += available
-                if price:
-                    other_prices.append(price)
+    @metrics.timed('processor_seconds')
+    def __call__(self, data, attrs=None):
+        # numpy and pandas are imported on first use so that the retriever stays cheap to import
+        import pandas as pd
 
-        if other_total > 0:
-            other_price_avg = round(sum(other_prices) / len(other_prices), 2) if other_prices else None
-            gpu_data.append(("Other", other_total, other_available, other_price_avg))
+        # attrs limits the frame to the series a thread needs, the others are neither loaded nor built
+        attrs = self.attrs if attrs is None else [attr for attr in self.attrs if attr in attrs]
+        if self.store is not None:
+            if isinstance(data, LazyData):
+                data.load(attrs)
+            series = self.store.snapshots(attrs)
+        else:
+            series = {attr: data[attr] for attr in attrs}
+        df = self.build_frame(series, attrs)
 
-        # Sorting by total GPUs
-        gpu_data.sort(key=lambda x: x[1], reverse=True)
-        gpu_details = pd.DataFrame(gpu_data, columns=['model', 'total', 'available', 'price'])
+        from utils.market import fold_models
+
+        # Without gpu-prices (and nothing to fall back to) the thread still goes out, with an empty GPU chart
+        try:
+            models = data['gpu_prices'].models
+        except KeyError:
+            models = []
+        names, totals, availables, prices = fold_models([model.name for model in models],
+                                                        [model.total for model in models],
+                                                        [model.available for model in models],
+                                                        [model.price for model in models])
+        gpu_details = pd.DataFrame({'model': names.astype(str), 'total': totals, 'available': availables,
+                                    'price': prices})
 
-        return df, gpu_details, data['market'], data['dashboard']
+        # A missing market document leaves the price line out, a missing dashboard is rebuilt from the stored
+        # series without chain stats, or left out too when there are not two days of them
+        market = self.document(data, 'market')
+        dashboard = self.document(data, 'dashboard')
+        if dashboard is None and len(df) >= 2:
+            dashboard = self.dashboard(df)
+        return df, gpu_details, market, dashboard
+
+    @staticmethod
+    def document(data, attr):
+        try:
+            return data[attr]
+        except KeyError:
+            return None
+
+    @classmethod
+    def dashboard(cls, df):
+        # The dashboard's now and compare blocks rebuilt from the last two days of a frame, back in the API's
+        # units and without chain stats. Figures whose series were not built are None
+        def network_stats(row):
+            values = []
+            for attr in AkashStatsRetriever.graph_series:
+                value = row.get(cls.renames.get(attr, attr))
+                values.append(value * 1000000 if value is not None and attr in cls.micro_units else value)
+            return NetworkStats(row['date'].strftime('%Y-%m-%d'), *values)
+
+        total_gpu = int(df['totalGPU'].iloc[-1]) if 'totalGPU' in df else None
+        return Dashboard(network_stats(df.iloc[-1]), network_stats(df.iloc[-2]), total_gpu, None)
+
+    def build_frame(self, series, attrs=None):
+        import numpy as np
+        import pandas as pd
+
+        attrs = attrs or self.attrs
+        # Code every date string against one shared table so each distinct date is parsed exactly once
+        raw_dates = {}
+        date_codes = [np.fromiter((raw_dates.setdefault(date, len(raw_dates)) for date in series[attr].dates),
+                                  dtype=np.int32, count=len(series[attr].dates))
+                      for attr in attrs]
+        codes, dates = pd.factorize(pd.to_datetime(list(raw_dates), format='ISO8601'))
+
+        # The inner join keeps the dates that every series has a value for, position maps them to their row
+        complete = np.ones(len(dates), dtype=bool)
+        for date_code in date_codes:
+            present = np.zeros(len(dates), dtype=bool)
+            present[codes[date_code]] = True
+            complete &= present
+        position = np.full(len(dates), -1)
+        position[complete] = np.arange(np.count_nonzero(complete))
+
+        # Each column is gathered straight from its series and written once in its final dtype, so no dense
+        # dates x attrs matrix or per-column astype copy is ever held next to the frame
+        columns = {'date': dates[complete]}
+        for attr, date_code in zip(attrs, date_codes):
+            row = position[codes[date_code]]
+            kept = np.flatnonzero(row >= 0)
+            column = np.frombuffer(series[attr].values, dtype=np.float64)[kept]
+            row = row[kept]
+            if attr in self.micro_units:
+                column /= 1000000
+                dtype = np.float64
+            elif attr in self.int32_attrs and np.abs(column).max(initial=0) < np.iinfo(np.int32).max:
+                dtype = np.int32
+            elif np.all(np.mod(column, 1) == 0):
+                dtype = np.int64
+            else:
+                dtype = np.float64
+            if dtype is not np.float64 or not np.array_equal(row, np.arange(len(row))):
+                # The series' dates are out of row order or the column is narrowed, place the values by row
+                typed = np.empty(len(row), dtype=dtype)
+                typed[row] = column
+                column = typed
+            columns[self.renames.get(attr, attr)] = column
+        # The columns already have their final dtypes, the frame takes them over without consolidating copies
+        df = pd.DataFrame(columns, copy=False)
+        if 'activeGPU' in df and 'totalGPU' in df:
+            df['utilization'] = df['activeGPU'] / df['totalGPU']
+        return df
 
 
 if __name__ == '__main__':
     retriever = AkashStatsRetriever(**settings.akash_api)
-    if os.path.exists('data/data.pickle'):
-        with open('data/data.pickle', 'rb') as handle:
-            data = pickle.load(handle)
-    else:
-        data = retriever.retrieve('all', save_to_json=True)
-        with open('data/data.pickle', 'wb') as handle:
-            pickle.dump(data, handle, protocol=pickle.HIGHEST_PROTOCOL)
-    processor = AkashStatsProcessor()
+    data = retriever.retrieve('all')
+    processor = AkashStatsProcessor(store=retriever.store)
     df, gpu_details, market_details, dashboard= processor(data)
 
-    logger.info(dashboard['now'])
+    logger.info(dashboard.now)
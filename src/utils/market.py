@@ -0,0 +1,184 @@
+import os
+import threading
+
+import numpy as np
+
+from utils.logger import logger
+from utils.trend import fit_trends
+
+missing = -1
+
+
+def fold_models(names, totals, availables, prices, min_total=10):
+    # Models with min_total GPUs or fewer are folded into one "Other" row, then everything is sorted by total.
+    # Returns the model, total, available and price columns
+    names = np.asarray(names, dtype=object)
+    totals = np.asarray(totals, dtype=np.int64)
+    availables = np.asarray(availables, dtype=np.int64)
+    prices = np.asarray([np.nan if price is None else price for price in prices], dtype=np.float64)
+    large = totals > min_total
+    columns = [names[large], totals[large], availables[large], prices[large]]
+    small = ~large
+    if totals[small].sum() > 0:
+        small_prices = prices[small]
+        small_prices = small_prices[~np.isnan(small_prices) & (small_prices != 0)]
+        other_price = round(float(small_prices.mean()), 2) if len(small_prices) else np.nan
+        columns = [np.append(columns[0], 'Other'), np.append(columns[1], totals[small].sum()),
+                   np.append(columns[2], availables[small].sum()), np.append(columns[3], other_price)]
+    order = np.argsort(-columns[1], kind='stable')
+    return [column[order] for column in columns]
+
+
+def forward_fill(matrix):
+    # Carries the last known value of every column over the days a model was not listed
+    rows = np.where(np.isnan(matrix), 0, np.arange(len(matrix))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return matrix[rows, np.arange(matrix.shape[1])]
+
+
+class GpuMarketIndex:
+    # Daily per-model GPU totals, availability and average price, kept as days x models arrays in one .npz file.
+    # A model seen for the first time gets a new column, missing counts are -1 and missing prices NaN
+
+    fields = ('total', 'available', 'price')
+
+    def __init__(self, path='data/gpu_index.npz'):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.path = path
+        self.lock = threading.Lock()
+        self.models = []
+        self.columns = {}
+        self.days = np.empty(0, dtype='datetime64[D]')
+        self.total = np.empty((0, 0), dtype=np.int32)
+        self.available = np.empty((0, 0), dtype=np.int32)
+        self.price = np.empty((0, 0), dtype=np.float64)
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with np.load(self.path, allow_pickle=False) as arrays:
+            self.models = arrays['models'].tolist()
+            self.columns = {model: column for column, model in enumerate(self.models)}
+            self.days = arrays['days']
+            self.total = arrays['total']
+            self.available = arrays['available']
+            self.price = arrays['price']
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with self.lock, open(tmp_path, 'wb') as f:
+            np.savez(f, models=np.array(self.models, dtype=str), days=self.days, total=self.total,
+                     available=self.available, price=self.price)
+        os.replace(tmp_path, self.path)
+
+    def record(self, day, gpu_prices):
+        # Upserts one day from a decoded gpu-prices response, listings of the same model are summed and their
+        # prices averaged
+        day = np.datetime64(day, 'D')
+        names = [model.name for model in gpu_prices.models]
+        with self.lock:
+            new_models = list(dict.fromkeys(name for name in names if name not in self.columns))
+            if new_models:
+                self.columns.update({model: len(self.models) + i for i, model in enumerate(new_models)})
+                self.models.extend(new_models)
+                padding = ((0, 0), (0, len(new_models)))
+                self.total = np.pad(self.total, padding, constant_values=missing)
+                self.available = np.pad(self.available, padding, constant_values=missing)
+                self.price = np.pad(self.price, padding, constant_values=np.nan)
+            row = int(np.searchsorted(self.days, day))
+            if row == len(self.days) or self.days[row] != day:
+                self.days = np.insert(self.days, row, day)
+                self.total = np.insert(self.total, row, missing, axis=0)
+                self.available = np.insert(self.available, row, missing, axis=0)
+                self.price = np.insert(self.price, row, np.nan, axis=0)
+
+            columns = np.array([self.columns[name] for name in names], dtype=np.int64)
+            listed, codes = np.unique(columns, return_inverse=True)
+            totals = np.zeros(len(listed), dtype=np.int64)
+            availables = np.zeros(len(listed), dtype=np.int64)
+            np.add.at(totals, codes, [model.total for model in gpu_prices.models])
+            np.add.at(availables, codes, [model.available for model in gpu_prices.models])
+            prices = np.array([np.nan if model.price is None else model.price for model in gpu_prices.models])
+            priced = ~np.isnan(prices)
+            price_sums = np.zeros(len(listed))
+            price_counts = np.zeros(len(listed))
+            np.add.at(price_sums, codes[priced], prices[priced])
+            np.add.at(price_counts, codes[priced], 1)
+
+            self.total[row] = missing
+            self.available[row] = missing
+            self.price[row] = np.nan
+            self.total[row, listed] = totals
+            self.available[row, listed] = availables
+            with np.errstate(invalid='ignore'):
+                self.price[row, listed] = price_sums / price_counts
+        self.logger.debug(f"Recorded {len(listed)} GPU models for {day}")
+
+    def matrix(self, field='price', models=None, start=None, end=None):
+        # (days, models, values) of one field with missing entries as NaN, optionally cut to a day range
+        assert field in self.fields
+        values = getattr(self, field).astype(np.float64)
+        if field != 'price':
+            values[values == missing] = np.nan
+        rows = slice(np.searchsorted(self.days, np.datetime64(start, 'D')) if start else None,
+                     np.searchsorted(self.days, np.datetime64(end, 'D'), side='right') if end else None)
+        if models is None:
+            models = list(self.models)
+            columns = slice(None)
+        else:
+            columns = [self.columns[model] for model in models]
+        return self.days[rows], models, values[rows][:, columns]
+
+    def history(self, field='price', models=None, start=None, end=None):
+        import pandas as pd
+
+        days, models, values = self.matrix(field, models=models, start=start, end=end)
+        return pd.DataFrame(values, index=pd.DatetimeIndex(days, name='date'), columns=models)
+
+    def top_models(self, n=5, day=None):
+        # Models with the most GPUs on a day, the latest one by default. A day that was not recorded has none
+        row = len(self.days) - 1
+        if day is not None:
+            day = np.datetime64(day, 'D')
+            row = int(np.searchsorted(self.days, day))
+            if row == len(self.days) or self.days[row] != day:
+                return []
+        if row < 0:
+            return []
+        order = np.argsort(-self.total[row], kind='stable')[:n]
+        return [self.models[column] for column in order if self.total[row, column] > 0]
+
+    def changes(self, field='price', periods=7):
+        # Relative change against the same model `periods` calendar days earlier, for every day at once;
+        # NaN where either day is missing
+        days, models, values = self.matrix(field)
+        previous = np.searchsorted(days, days - periods)
+        found = (previous < len(days)) & (days[np.minimum(previous, len(days) - 1)] == days - periods)
+        before = np.full_like(values, np.nan)
+        before[found] = values[previous[found]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return days, models, np.where(before != 0, values / before - 1, np.nan)
+
+    def movers(self, field='price', periods=7, models=None, top=3):
+        # Latest value and change of the models that moved the most, largest absolute change first
+        days, names, changes = self.changes(field, periods=periods)
+        if not len(days):
+            return []
+        latest = self.matrix(field)[2][-1]
+        change = changes[-1]
+        candidates = np.arange(len(names)) if models is None else np.array([self.columns[model] for model in models])
+        candidates = candidates[~np.isnan(change[candidates])]
+        order = candidates[np.argsort(-np.abs(change[candidates]), kind='stable')][:top]
+        return [(names[column], float(latest[column]), float(change[column])) for column in order]
+
+    def trends(self, field='price', models=None, days=30, method='rolling', **kwargs):
+        # One vectorised fit per model over the last `days` days, models without data in the window are skipped
+        dates, models, values = self.matrix(field, models=models)
+        dates, values = dates[-days:], forward_fill(values)[-days:]
+        listed = ~np.isnan(values).any(axis=0)
+        fit, band = fit_trends(dates.astype(np.int64), values[:, listed], method=method, **kwargs)
+        return dates, [model for model, keep in zip(models, listed) if keep], fit, band
@@ -0,0 +1,168 @@
+import cProfile
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from configs import settings
+from utils.logger import logger
+
+prefix = 'akash_bot_'
+
+
+def label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def format_labels(key):
+    return '{' + ','.join(f'{name}="{value}"' for name, value in key) + '}' if key else ''
+
+
+class Metrics:
+    # Process-wide timings and counters, exported as Prometheus text or as a JSON file
+
+    def __init__(self, json_path=None, port=None, profile=None, profile_dir='data/profiles'):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.json_path = json_path
+        self.port = port
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.counters = {}
+        self.server = None
+
+    def observe(self, name, seconds, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            count, total, maximum = self.timings.get(key, (0, 0.0, 0.0))
+            self.timings[key] = (count + 1, total + seconds, max(maximum, seconds))
+
+    def inc(self, name, value=1, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        # Decorator flavour of timer() for plain and async functions
+        def decorator(function):
+            if inspect.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def wrapped(*args, **kwargs):
+                    with self.timer(name, **labels):
+                        return await function(*args, **kwargs)
+            else:
+                @functools.wraps(function)
+                def wrapped(*args, **kwargs):
+                    with self.timer(name, **labels):
+                        return function(*args, **kwargs)
+            return wrapped
+        return decorator
+
+    @contextmanager
+    def profiled(self, stage):
+        # Profiles the block when metrics.profile is set to cprofile or pyinstrument, otherwise costs nothing
+        if not self.profile:
+            yield
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{stage}_{datetime.now(timezone.utc).strftime('%Y-%m-%d_%H-%M-%S')}")
+        if self.profile == 'pyinstrument':
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(f'{path}.html', 'w', encoding='utf-8') as f:
+                    f.write(profiler.output_html())
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(f'{path}.prof')
+        self.logger.info(f"Wrote {self.profile} profile of {stage} to {path}")
+
+    def to_dict(self):
+        with self.lock:
+            timings = dict(self.timings)
+            counters = dict(self.counters)
+        return {'timings': [{'name': name, 'labels': dict(key), 'count': count, 'sum': total, 'max': maximum}
+                            for (name, key), (count, total, maximum) in sorted(timings.items())],
+                'counters': [{'name': name, 'labels': dict(key), 'value': value}
+                             for (name, key), value in sorted(counters.items())]}
+
+    def to_prometheus(self):
+        with self.lock:
+            timings = dict(self.timings)
+            counters = dict(self.counters)
+        lines = []
+        for name in sorted({name for name, _ in timings}):
+            lines.append(f'# TYPE {prefix}{name} summary')
+            for (metric, key), (count, total, _) in sorted(timings.items()):
+                if metric == name:
+                    lines.append(f'{prefix}{name}_count{format_labels(key)} {count}')
+                    lines.append(f'{prefix}{name}_sum{format_labels(key)} {total:.6f}')
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f'# TYPE {prefix}{name} counter')
+            for (metric, key), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{prefix}{name}{format_labels(key)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path=None):
+        path = path or self.json_path
+        if not path:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+
+    def serve(self, port=None):
+        # Prometheus scrape endpoint on /metrics in a daemon thread
+        port = port or self.port
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True, name='metrics').start()
+        self.logger.info(f"Serving metrics on port {port}")
+        return self.server
+
+
+metrics = Metrics(**settings.get('metrics', {}))
@@ -1,5 +1,4 @@
 import os
-import pickle
 from datetime import datetime, timezone
 
 import matplotlib.dates as mdates
@@ -9,20 +8,27 @@ import pandas as pd
 import seaborn as sns
 from matplotlib.dates import date2num
 
-from utils.data import AkashStatsProcessor
+from configs import settings
 from utils.logger import logger
+from utils.trend import fit_trends
 
-if os.path.exists('data/data.pickle'):
-    with open('data/data.pickle', 'rb') as handle:
-        data = pickle.load(handle)
 
+def draw_trend(ax, x, trends, column, color):
+    fit, band = trends
+    ax.plot(x, fit[:, column], color=color, linewidth=1)
+    if band is not None:
+        ax.fill_between(x, band[0][:, column], band[1][:, column], color=color, alpha=0.15, linewidth=0)
 
-def create_gpu_plot(df, name='gpus.png', granularity='day', amount=1, save=True):
+
+def create_gpu_plot(df, name='gpus.png', granularity='day', amount=1, save=True, trend='poly', ci=95):
     granularities = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
     assert granularity in granularities
     samples = granularities[granularity] * amount
     data = df.tail(samples).copy()
     data['date_numeric'] = date2num(data['date'])
+    if samples > 20:
+        # One vectorised fit for all three series instead of a bootstrapped regplot per series
+        trends = fit_trends(data['date_numeric'], data[['activeGPU', 'totalGPU', 'utilization']], method=trend, ci=ci)
 
     # Set Seaborn theme for better visualization
     sns.set_theme(style="whitegrid")
@@ -31,12 +37,10 @@ def create_gpu_plot(df, name='gpus.png', granularity='day', amount=1, save=True)
     fig, ax1 = plt.subplots(figsize=(10, 5))
     sns.lineplot(x=data["date"], y=data["activeGPU"], marker="o", label='Active GPUs', ax=ax1, color='blue')
     if samples > 20:
-        sns.regplot(x=data["date_numeric"], y=data["activeGPU"], ax=ax1, scatter=False,
-                    line_kws={"color": "blue", "linewidth": 1}, order=2)
+        draw_trend(ax1, data["date"], trends, 0, color='blue')
     sns.lineplot(x=data["date"], y=data["totalGPU"], marker="D", label='Total GPUs', ax=ax1, color='green')
     if samples > 20:
-        sns.regplot(x=data["date_numeric"], y=data["totalGPU"], ax=ax1, scatter=False,
-                    line_kws={"color": "green", "linewidth": 1}, order=2)
+        draw_trend(ax1, data["date"], trends, 1, color='green')
     # sns.lineplot(x=active_gpu["date"], y=active_gpu["value"]/total_gpu["value"], marker="*", label='GPU utilization')
 
     # Formatting the x-axis to show Month and Year (e.g., "Apr 2024")
@@ -64,8 +68,7 @@ def create_gpu_plot(df, name='gpus.png', granularity='day', amount=1, save=True)
     sns.lineplot(x=data["date"], y=data["utilization"], marker="s", ax=ax2, label="Utilization Rate", color="r",
                  legend=False)
     if samples > 20:
-        sns.regplot(x=data["date_numeric"], y=data["utilization"], ax=ax2, scatter=False, color="r",
-                    line_kws={"color": "red", "linewidth": 1}, order=2)
+        draw_trend(ax2, data["date"], trends, 2, color='red')
 
     ax2.set_ylabel("Utilization Rate (%)", color="r")
     ax2.tick_params(axis="y", labelcolor="r")
@@ -85,6 +88,7 @@ def create_gpu_plot(df, name='gpus.png', granularity='day', amount=1, save=True)
     plt.title(f"Akash GPUs in the last {amount}-{granularity} period", fontweight='bold')
     if save:
         plt.savefig(name, dpi=300, bbox_inches="tight")
+        plt.close(fig)
     #plt.show()
 
 
@@ -129,11 +133,12 @@ def create_usd_plot(df, name='usd_spent.png', granularity='day', amount=7, save=
     plt.tight_layout()
     if save:
         plt.savefig(name, dpi=300, bbox_inches="tight")
+        plt.close(fig)
     #plt.show()
 
 
-def create_gpu_availability_and_price_plot(gpu_data, name='gpu_details.png', save=True):
-    current_time = datetime.now(timezone.utc)
+def create_gpu_availability_and_price_plot(gpu_data, name='gpu_details.png', save=True, as_of=None):
+    current_time = as_of or datetime.now(timezone.utc)
     formatted_time = current_time.strftime("%Y-%m-%d")
     gpu_data = gpu_data.to_dict('list')
     labels = gpu_data['model']
@@ -170,11 +175,44 @@ def create_gpu_availability_and_price_plot(gpu_data, name='gpu_details.png', sav
     plt.tight_layout()
     if save:
         plt.savefig(name, dpi=300, bbox_inches="tight")
+        plt.close(fig)
     #plt.show()
 
 
+def create_gpu_price_trend_plot(prices, name='gpu_prices.png', granularity='week', amount=4, save=True,
+                                trend='rolling', ci=None):
+    # prices is a GpuMarketIndex history frame: one column of daily average prices per model
+    data = prices.ffill().dropna(axis=1, how='all')
+    x = date2num(data.index)
+    complete = [i for i, model in enumerate(data.columns) if data[model].notna().all()]
+    if len(data) > 20 and complete:
+        trends = fit_trends(x, data.iloc[:, complete].to_numpy(), method=trend, ci=ci)
+
+    sns.set_theme(style="whitegrid")
+    fig, ax = plt.subplots(figsize=(10, 5))
+    colors = sns.color_palette(n_colors=len(data.columns))
+    for i, model in enumerate(data.columns):
+        ax.plot(data.index, data[model], marker="o", markersize=3, linewidth=1.5, label=model, color=colors[i])
+        if len(data) > 20 and i in complete:
+            draw_trend(ax, data.index, trends, complete.index(i), color=colors[i])
+
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%d %b %Y" if granularity in ('day', 'week') else "%b %Y"))
+    ax.set_xlabel("Date", weight='bold')
+    ax.set_ylabel("Average price (USD/hour)", weight='bold')
+    ax.tick_params(axis="x", rotation=25)
+    ax.legend(loc="upper left")
+    plt.title(f"Average GPU prices on Akash in the last {amount}-{granularity} period", fontweight='bold')
+    if save:
+        plt.savefig(name, dpi=300, bbox_inches="tight")
+        plt.close(fig)
+
+
 if __name__ == '__main__':
-    processor = AkashStatsProcessor()
+    from utils.data import AkashStatsRetriever, AkashStatsProcessor
+
+    retriever = AkashStatsRetriever(**settings.akash_api)
+    data = retriever.retrieve('all')
+    processor = AkashStatsProcessor(store=retriever.store)
     df, gpu_details, market_details, dashboard = processor(data)
     create_gpu_plot(df, name='gpus.png', granularity='day', amount=7)
     create_gpu_availability_and_price_plot(gpu_details, name='gpu_details.png')
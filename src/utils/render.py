@@ -0,0 +1,231 @@
+import hashlib
+import importlib
+import importlib.util
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.logger import logger
+from utils.metrics import metrics
+
+image_extensions = ('.png', '.webp')
+
+
+def init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def resolve(function):
+    # Jobs may name their plot function as 'module:function' so the parent never has to import matplotlib
+    if isinstance(function, str):
+        module, name = function.split(':')
+        return getattr(importlib.import_module(module), name)
+    return function
+
+
+def function_name(function):
+    return function.split(':')[-1] if isinstance(function, str) else function.__name__
+
+
+def fit_image(path, max_bytes, formats=('png', 'webp'), scales=(1.0, 0.75, 0.5, 0.35)):
+    # Re-encodes a rendered chart at the largest scale where one of its encodings fits into max_bytes, lossless
+    # PNG and WebP first, then a 256-colour PNG and lossy WebP. Returns the path of the file that was kept
+    if os.path.getsize(path) <= max_bytes:
+        return path
+    from PIL import Image
+
+    candidates = [('png', 'PNG', False, {'optimize': True}), ('webp', 'WEBP', False, {'lossless': True}),
+                  ('png', 'PNG', True, {'optimize': True}), ('webp', 'WEBP', False, {'quality': 90})]
+    candidates = [candidate for candidate in candidates if candidate[0] in formats]
+    with Image.open(path) as image:
+        image = image.convert('RGB')
+    smallest = None
+    for scale in scales:
+        resized = image if scale == 1 else image.resize((round(image.width * scale), round(image.height * scale)),
+                                                        Image.LANCZOS)
+        for extension, image_format, palette, options in candidates:
+            buffer = io.BytesIO()
+            (resized.quantize(256) if palette else resized).save(buffer, image_format, **options)
+            if buffer.tell() <= max_bytes:
+                return replace_image(path, extension, buffer.getvalue())
+            if smallest is None or buffer.tell() < len(smallest[1]):
+                smallest = (extension, buffer.getvalue())
+    logger.warning(f"{path} does not fit into {max_bytes} bytes, keeping its smallest encoding")
+    return replace_image(path, *smallest)
+
+
+def replace_image(path, extension, content):
+    replacement = f'{os.path.splitext(path)[0]}.{extension}'
+    tmp_path = f'{replacement}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, replacement)
+    if replacement != path:
+        os.remove(path)
+    return replacement
+
+
+def render_job(function, args, kwargs, max_bytes=None, formats=('png', 'webp')):
+    # Returns the drawing time as well, the worker's own metrics never reach the parent process
+    import matplotlib.pyplot as plt
+    function = resolve(function)
+    start = time.perf_counter()
+    try:
+        function(*args, **kwargs)
+    finally:
+        plt.close('all')
+    path = fit_image(kwargs['name'], max_bytes, formats) if max_bytes else kwargs['name']
+    return path, time.perf_counter() - start
+
+
+def fingerprint(value, digest):
+    # Feeds a stable description of a plot argument into the digest, frames and arrays by their content
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr((value.columns.tolist(), value.dtypes.astype(str).tolist())).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        digest.update(repr((value.name, str(value.dtype))).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        digest.update(repr((value.dtype.str, value.shape)).encode('utf-8'))
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'{type(value).__name__}{len(value)}'.encode('utf-8'))
+        for item in value:
+            fingerprint(item, digest)
+    elif isinstance(value, dict):
+        digest.update(f'dict{len(value)}'.encode('utf-8'))
+        for key in sorted(value, key=repr):
+            fingerprint(key, digest)
+            fingerprint(value[key], digest)
+    else:
+        digest.update(repr(value).encode('utf-8'))
+
+
+class RenderCache:
+    # Charts named after a hash of their plot function, its source file and the modules it draws with, the data
+    # and the parameters, so unchanged charts are reused instead of redrawn. The directory is kept under max_bytes
+    # and files unused for max_age seconds are deleted, old timestamped plots included
+
+    def __init__(self, directory='plots', max_bytes=256 * 1024 * 1024, max_age=7 * 86400,
+                 sources=('utils.plot', 'utils.trend')):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sources = tuple(sources)
+        self.hashes = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def source_hash(self, module):
+        # A change to the plotting code invalidates its charts, modules are hashed without importing them
+        if module not in self.hashes:
+            with open(importlib.util.find_spec(module).origin, 'rb') as f:
+                self.hashes[module] = hashlib.sha256(f.read()).hexdigest()
+        return self.hashes[module]
+
+    def key(self, function, args, kwargs, *options):
+        # The plot function's own module and the shared plotting helpers, whichever module the function lives in
+        module = function.split(':')[0] if isinstance(function, str) else function.__module__
+        digest = hashlib.sha256()
+        digest.update(function_name(function).encode('utf-8'))
+        for source in dict.fromkeys([module, *self.sources]):
+            digest.update(f':{source}:{self.source_hash(source)}'.encode('utf-8'))
+        fingerprint([list(args), {key: value for key, value in kwargs.items() if key != 'name'}, list(options)],
+                    digest)
+        return digest.hexdigest()[:24]
+
+    def stem(self, function, key):
+        return os.path.join(self.directory, f'{function_name(function)}-{key}')
+
+    def get(self, function, key):
+        for extension in image_extensions:
+            path = self.stem(function, key) + extension
+            if os.path.exists(path):
+                os.utime(path)  # mark as recently used for eviction
+                return path
+        return None
+
+    def evict(self, keep=()):
+        cutoff = time.time() - self.max_age
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(image_extensions) or path in keep:
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in sorted(files):
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.logger.debug(f"Evicted {path} ({size} bytes)")
+
+
+class PlotRenderer:
+    # Workers are forked from a server process that already imported the plotting stack, so each run only pays
+    # for drawing, and every worker exits with its figures once the run is over. With a byte budget every chart
+    # is re-encoded to fit it, and with a cache unchanged charts are not drawn at all
+
+    def __init__(self, max_workers=3, preload=('utils.plot',), max_bytes=None, formats=('png', 'webp'),
+                 cache=None):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.max_workers = max_workers
+        self.max_bytes = max_bytes
+        self.formats = tuple(formats)
+        self.cache = RenderCache(**cache) if cache else None
+        self.context = multiprocessing.get_context('forkserver')
+        self.context.set_forkserver_preload(list(preload))
+
+    def render(self, jobs):
+        # jobs are (plot function or 'module:function', args, kwargs) tuples, kwargs must carry the output file name.
+        # Returns the path of every chart in job order, cached charts live under the cache's own names
+        paths, pending = [], {}
+        for function, args, kwargs in jobs:
+            if self.cache is None:
+                path = None
+            else:
+                key = self.cache.key(function, args, kwargs, self.max_bytes, self.formats)
+                path = self.cache.get(function, key)
+                metrics.inc('plot_cache_total', plot=function_name(function), result='miss' if path is None else 'hit')
+                if path is None:
+                    kwargs = {**kwargs, 'name': self.cache.stem(function, key) + os.path.splitext(kwargs['name'])[1]}
+            if path is None:
+                # Identical jobs in one batch are drawn once
+                path = kwargs['name']
+                pending.setdefault(path, (function, args, kwargs))
+            paths.append(path)
+
+        if pending:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(pending)), mp_context=self.context,
+                                     initializer=init_worker) as executor:
+                futures = {target: executor.submit(render_job, function, args, kwargs, self.max_bytes, self.formats)
+                           for target, (function, args, kwargs) in pending.items()}
+                rendered = {}
+                for target, future in futures.items():
+                    path, seconds = future.result()
+                    plot = function_name(pending[target][0])
+                    metrics.observe('plot_seconds', seconds, plot=plot)
+                    metrics.inc('plot_bytes_total', os.path.getsize(path), plot=plot)
+                    rendered[target] = path
+            paths = [rendered.get(path, path) for path in paths]
+        if self.cache is not None:
+            self.cache.evict(keep=set(paths))
+        self.logger.debug(f"Rendered {len(pending)} of {len(jobs)} plots")
+        return paths
@@ -1,55 +1,96 @@
-import json
-import pickle
-from abc import ABC, abstractmethod
-import os
 from datetime import datetime, timezone
 
-import pandas as pd
-import requests
-
-from utils.data import AkashStatsRetriever, AkashStatsProcessor
+from llm.stream import weighted_length, weighted_prefix
 from utils.logger import logger
 from configs import settings
 
 
 class Reporter:
+    char_limit = 280
+    labels = {'activeGPU': 'active GPUs', 'utilization': 'GPU utilization', 'dailyUsdSpent': 'daily USD spent'}
+    # Endpoints behind the daily report: the quoted figures and the series of the rolling line
+    sources = ('market', 'dashboard', 'activeGPU', 'gpu', 'dailyUUsdSpent')
 
-    def generate_report(self, market_data, dashboard):
-        current_time = datetime.now(timezone.utc)
+    def generate_report(self, market_data, dashboard, rolling=None, stale=None, as_of=None, period=None):
+        # as_of dates a regenerated past report, market data and chain stats may be missing for those.
+        # period names the thread's view when one batch posts several, X rejects identical opening tweets
+        current_time = as_of or datetime.now(timezone.utc)
         formatted_time = current_time.strftime("%Y-%m-%d")
-        price_emoji = '🚀' if market_data['priceChangePercentage24'] >= 0.0 else '📉'
 
-        total_gpus = dashboard['networkCapacity']['totalGPU']
-        active_gpus_now = dashboard['now']['activeGPU']
-        active_gpus_yesterday = dashboard['compare']['activeGPU']
-        utilization = active_gpus_now/total_gpus
-        gpu_change_prc = ((active_gpus_now - active_gpus_yesterday) / active_gpus_yesterday) *100
-        gpu_emoji = '📈' if gpu_change_prc >= 0.0 else '📉'
+        report = f"Akash Network Daily Report - {formatted_time}{f' ({period} view)' if period else ''}\n\n"
+        if market_data is not None and dashboard is not None and dashboard.chain_stats is not None:
+            price_emoji = '🚀' if market_data.price_change_percentage_24 >= 0.0 else '📉'
+            report += f"{price_emoji} $AKT: {market_data.price:.2f}$ ({market_data.price_change_percentage_24:+.2f}% in 24h), staking APR: {dashboard.chain_stats.staking_apr*100:.2f}, bonded: {(dashboard.chain_stats.bonded_tokens/dashboard.chain_stats.total_supply)*100:.2f}%\n"
+        # Without a dashboard, or the series to rebuild one, the GPU and USD lines are left out
+        if dashboard is not None and None not in (dashboard.total_gpu, dashboard.now.active_gpu, dashboard.compare.active_gpu):
+            total_gpus = dashboard.total_gpu
+            active_gpus_now = dashboard.now.active_gpu
+            active_gpus_yesterday = dashboard.compare.active_gpu
+            utilization = active_gpus_now/total_gpus
+            gpu_change_prc = ((active_gpus_now - active_gpus_yesterday) / active_gpus_yesterday) *100
+            gpu_emoji = '📈' if gpu_change_prc >= 0.0 else '📉'
+            report += f"{gpu_emoji} Active GPUs: {active_gpus_now} ({gpu_change_prc:+.2f}% in 24h) (out of {total_gpus} GPUs, {utilization:.2}% util)\n"
+        if dashboard is not None and None not in (dashboard.now.daily_uusd_spent, dashboard.compare.daily_uusd_spent):
+            usd_spend_now = dashboard.now.daily_uusd_spent / 1000000000
+            usd_spend_now_yesterday = dashboard.compare.daily_uusd_spent / 1000000000
+            usd_spend_change_prc = ((usd_spend_now - usd_spend_now_yesterday) / usd_spend_now_yesterday) *100
+            usd_spent_emoji = '📈' if usd_spend_change_prc >= 0.0 else '📉'
+            report += f"{usd_spent_emoji} Daily USD spent: ${usd_spend_now:.2f}K ({usd_spend_change_prc:+.2f}% in 24h)\n"
+        footer = "@akashnet_ #DeCloud #DePIN #AI"
+
+        # A note on cached figures comes first, then the precomputed rolling metrics. Each adds the longest of its
+        # variants that keeps the tweet within the limit
+        for lines in (self.stale_lines(stale) if stale else [], self.rolling_lines(rolling) if rolling else []):
+            for line in lines:
+                if weighted_length(report + line + '\n' + footer) <= self.char_limit:
+                    report += line + '\n'
+                    break
+        return report + footer
 
-        usd_spend_now = dashboard['now']['dailyUUsdSpent'] / 1000000000
-        usd_spend_now_yesterday = dashboard['compare']['dailyUUsdSpent'] / 1000000000
-        usd_spend_change_prc = ((usd_spend_now - usd_spend_now_yesterday) / usd_spend_now_yesterday) *100
-        usd_spent_emoji = '📈' if usd_spend_change_prc >= 0.0 else '📉'
+    def with_period(self, text, period=None):
+        # Replies every thread of a batch shares are told apart by their thread's view, X rejects identical tweets.
+        # The text is cut to keep the tweet within the limit
+        if not period:
+            return text
+        suffix = f" ({period} view)"
+        return weighted_prefix(text, self.char_limit - weighted_length(suffix)).rstrip() + suffix
 
+    @staticmethod
+    def stale_lines(stale):
+        # stale maps the endpoints that fell back to their last good response to its age in seconds
+        age = max(stale.values())
+        age = f'{age / 3600:.0f}h' if age >= 3600 else f'{max(age / 60, 1):.0f}m'
+        return [f"⏳ Some figures are cached ({age} old)", f"⏳ Cached data ({age} old)", "⏳ Cached data"]
 
-        report = (f"Akash Network Daily Report - {formatted_time}\n\n"
-                  f"{price_emoji} $AKT: {market_data['price']:.2f}$ ({market_data['priceChangePercentage24']:+.2f}% in 24h), staking APR: {dashboard['chainStats']['stakingAPR']*100:.2f}, bonded: {(dashboard['chainStats']['bondedTokens']/dashboard['chainStats']['totalSupply'])*100:.2f}%\n"
-                  f"{gpu_emoji} Active GPUs: {active_gpus_now} ({gpu_change_prc:+.2f}% in 24h) (out of {total_gpus} GPUs, {utilization:.2}% util)\n"
-                  f"{usd_spent_emoji} Daily USD spent: ${usd_spend_now:.2f}K ({usd_spend_change_prc:+.2f}% in 24h)\n"
-                  f"@akashnet_ #DeCloud #DePIN #AI")
+    def rolling_lines(self, rolling):
+        # An anomaly is worth more than the usual weekly trend of active GPUs, candidates go from long to short
+        for column, values in rolling.items():
+            if values['anomaly']:
+                return [f"⚠️ Unusual {self.labels.get(column, column)} (z-score {values['z']:+.1f})",
+                        f"⚠️ Unusual {self.labels.get(column, column)}"]
+        gpus = rolling.get('activeGPU')
+        if not gpus or gpus['ma7'] is None or gpus['wow_pct'] is None:
+            return []
+        lines = [f"📊 GPUs 7d avg: {gpus['ma7']:.0f} ({gpus['wow_pct']:+.1f}% WoW)"]
+        if gpus['mom_pct'] is not None:
+            lines.insert(0, f"📊 GPUs 7d avg: {gpus['ma7']:.0f} ({gpus['wow_pct']:+.1f}% WoW, {gpus['mom_pct']:+.1f}% MoM)")
+        return lines
 
-        return report
+    def generate_price_report(self, index, periods=7, models=8, top=4):
+        # Average price and change over `periods` days of the biggest GPU models that moved the most
+        movers = index.movers('price', periods=periods, models=index.top_models(n=models), top=top)
+        lines = [f"{'📈' if change >= 0.0 else '📉'} {model}: ${price:.2f} ({change * 100:+.2f}% in {periods}d)"
+                 for model, price, change in movers]
+        if not lines:
+            return f"Average GPU prices on Akash, not enough history yet for a {periods}-day change"
+        return "Average GPU prices on Akash\n\n" + "\n".join(lines)
 
 if __name__ == '__main__':
+    from utils.data import AkashStatsRetriever, AkashStatsProcessor
+
     retriever = AkashStatsRetriever(**settings.akash_api)
-    if os.path.exists('data/data.pickle'):
-        with open('data/data.pickle', 'rb') as handle:
-            data = pickle.load(handle)
-    else:
-        data = retriever.retrieve('all', save_to_json=True)
-        with open('data/data.pickle', 'wb') as handle:
-            pickle.dump(data, handle, protocol=pickle.HIGHEST_PROTOCOL)
-    processor = AkashStatsProcessor()
+    data = retriever.retrieve('all')
+    processor = AkashStatsProcessor(store=retriever.store)
     df, gpu_details, market_details, dashboard= processor(data)
 
     reporter = Reporter()
@@ -0,0 +1,28 @@
+from utils.data import AkashStatsProcessor
+
+# What each part of a thread reads: API endpoints used as they are and columns of the processed daily frame.
+# The LLM descriptions of the plots are written from the same columns
+requirements = {
+    'report': {'endpoints': ['market', 'dashboard'], 'columns': []},
+    'gpu_plot': {'endpoints': [], 'columns': ['totalGPU', 'activeGPU', 'utilization']},
+    'usd_plot': {'endpoints': [], 'columns': ['activeLeaseCount', 'activeGPU', 'dailyUsdSpent']},
+    'gpu_details_plot': {'endpoints': ['gpu_prices'], 'columns': []},
+    'gpu_price_plot': {'endpoints': ['gpu_prices'], 'columns': []},  # through the market index fed by gpu_prices
+}
+# Columns computed from more than one series
+derived = {'utilization': ['activeGPU', 'gpu']}
+
+
+def series_of(column):
+    sources = {renamed: attr for attr, renamed in AkashStatsProcessor.renames.items()}
+    return derived.get(column, [sources.get(column, column)])
+
+
+def resolve(parts, columns=()):
+    # The endpoints to retrieve and the series to build for some thread parts plus any extra columns, in the
+    # retriever's and processor's own order
+    endpoints = [endpoint for part in parts for endpoint in requirements[part]['endpoints']]
+    columns = [column for part in parts for column in requirements[part]['columns']] + list(columns)
+    needed = {attr for column in columns for attr in series_of(column)}
+    attrs = [attr for attr in AkashStatsProcessor.attrs if attr in needed]
+    return list(dict.fromkeys(endpoints)) + attrs, attrs
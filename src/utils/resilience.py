@@ -0,0 +1,118 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from utils.logger import logger
+
+
+class CircuitOpenError(RuntimeError):
+
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f'Circuit of {endpoint} is open, next attempt in {retry_in:.0f}s')
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class LatencyTracker:
+    # Recent successful response times per endpoint, the hedging budget is their p95. Kept in a JSON file since the
+    # bot only fetches a handful of times a day and would otherwise never collect enough samples
+
+    def __init__(self, path=None, window=50, quantile=0.95, min_samples=5, min_budget=0.5):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.path = path
+        self.window = window
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_budget = min_budget
+        self.lock = threading.Lock()
+        self.samples = {}
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        self.samples = {endpoint: deque(values, maxlen=self.window) for endpoint, values in state.items()}
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            state = {endpoint: list(values) for endpoint, values in self.samples.items()}
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def record(self, endpoint, seconds):
+        with self.lock:
+            self.samples.setdefault(endpoint, deque(maxlen=self.window)).append(round(seconds, 4))
+
+    def budget(self, endpoint):
+        # None until there are enough samples to tell a slow request from a normal one
+        with self.lock:
+            values = sorted(self.samples.get(endpoint, ()))
+        if len(values) < self.min_samples:
+            return None
+        return max(values[min(math.ceil(self.quantile * len(values)) - 1, len(values) - 1)], self.min_budget)
+
+
+class CircuitBreaker:
+    # Per-endpoint breaker: after `failures` failures in a row the endpoint is skipped for `reset_after` seconds,
+    # then a single trial request decides whether it closes again. A request that carries a ticket is counted once,
+    # by whichever of its outcomes is recorded first
+
+    def __init__(self, failures=3, reset_after=600):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.failures = failures
+        self.reset_after = reset_after
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.opened_at = {}
+        self.trials = set()
+
+    def before(self, endpoint):
+        with self.lock:
+            opened_at = self.opened_at.get(endpoint)
+            if opened_at is None:
+                return
+            retry_in = opened_at + self.reset_after - time.monotonic()
+            if retry_in > 0 or endpoint in self.trials:
+                raise CircuitOpenError(endpoint, max(retry_in, 0))
+            self.trials.add(endpoint)
+
+    def success(self, endpoint):
+        with self.lock:
+            self.counts.pop(endpoint, None)
+            self.trials.discard(endpoint)
+            if self.opened_at.pop(endpoint, None) is not None:
+                self.logger.info(f"Circuit of {endpoint} closed")
+
+    def failure(self, endpoint):
+        with self.lock:
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+            self.trials.discard(endpoint)
+            if self.counts[endpoint] >= self.failures:
+                if endpoint not in self.opened_at:
+                    self.logger.warning(f"Circuit of {endpoint} opened after {self.counts[endpoint]} failures")
+                self.opened_at[endpoint] = time.monotonic()
+
+    def record(self, endpoint, ok, ticket=None):
+        if ticket is not None:
+            with self.lock:
+                if ticket.get('settled'):
+                    return False
+                ticket['settled'] = True
+        if ok:
+            self.success(endpoint)
+        else:
+            self.failure(endpoint)
+        return True
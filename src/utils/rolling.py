@@ -0,0 +1,124 @@
+import json
+import math
+import os
+from collections import deque
+
+from utils.logger import logger
+
+
+class RollingSeries:
+    # Running state of one daily series: the last max(windows) + 2 values (one spare so a revised day can be
+    # taken back) plus a running sum per window and the sum of squares of the longest one, so every new day is O(1)
+
+    def __init__(self, windows=(7, 30), last_date=None, values=()):
+        self.windows = tuple(windows)
+        self.last_date = last_date
+        self.values = deque(values, maxlen=max(self.windows) + 2)
+        self.sums = {window: math.fsum(list(self.values)[-window:]) for window in self.windows}
+        self.squares = math.fsum(value ** 2 for value in list(self.values)[-max(self.windows):])
+        self.z = None
+
+    def push(self, date, value):
+        longest = max(self.windows)
+        if date == self.last_date and self.values:
+            # The API revised today's value, take the old one back out first
+            self.pop()
+        # The z-score compares the new day against the longest window before it
+        count = min(len(self.values), longest)
+        if count >= 2:
+            mean = self.sums[longest] / count
+            std = math.sqrt(max(self.squares / count - mean ** 2, 0.0))
+            self.z = (value - mean) / std if std > 0 else 0.0
+        else:
+            self.z = None
+        for window in self.windows:
+            if len(self.values) >= window:
+                self.sums[window] -= self.values[-window]
+            self.sums[window] += value
+        if len(self.values) >= longest:
+            self.squares -= self.values[-longest] ** 2
+        self.squares += value ** 2
+        self.values.append(value)
+        self.last_date = date
+
+    def pop(self):
+        # Only ever undoes the latest push, the value that left each window is still in the buffer
+        longest = max(self.windows)
+        value = self.values.pop()
+        for window in self.windows:
+            self.sums[window] -= value
+            if len(self.values) >= window:
+                self.sums[window] += self.values[-window]
+        self.squares -= value ** 2
+        if len(self.values) >= longest:
+            self.squares += self.values[-longest] ** 2
+
+    def change(self, periods):
+        if len(self.values) <= periods or not self.values[-1 - periods]:
+            return None
+        return (self.values[-1] / self.values[-1 - periods] - 1) * 100
+
+    def snapshot(self, z_threshold=3.0):
+        averages = {f'ma{window}': (self.sums[window] / window if len(self.values) >= window else None)
+                    for window in self.windows}
+        return {'date': self.last_date, 'value': self.values[-1] if self.values else None, **averages,
+                'wow_pct': self.change(7), 'mom_pct': self.change(30), 'z': self.z,
+                'anomaly': self.z is not None and abs(self.z) >= z_threshold}
+
+    def state(self):
+        return {'last_date': self.last_date, 'values': list(self.values), 'z': self.z}
+
+
+class RollingMetrics:
+    # 7d/30d moving averages, week-over-week and month-over-month changes and z-score anomaly flags of a few
+    # processed columns, advanced day by day and kept in a JSON file between runs
+
+    def __init__(self, path='data/rolling.json', columns=('activeGPU', 'utilization', 'dailyUsdSpent'),
+                 windows=(7, 30), z_threshold=3.0):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.path = path
+        self.columns = list(columns)
+        self.windows = tuple(windows)
+        self.z_threshold = z_threshold
+        self.series = {column: RollingSeries(self.windows) for column in self.columns}
+        # Without a path the state only lives as long as the object, e.g. for one backfilled day
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        for column, values in state.items():
+            if column in self.series:
+                series = RollingSeries(self.windows, values['last_date'], values['values'])
+                series.z = values.get('z')
+                self.series[column] = series
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({column: series.state() for column, series in self.series.items()}, f)
+        os.replace(tmp_path, self.path)
+
+    def update(self, df):
+        # Feeds only the rows from each series' last date on (found by binary search on the sorted dates), so a
+        # run costs O(1) per new day; the first run replays the whole history once
+        import pandas as pd
+
+        pushed = 0
+        for column, series in self.series.items():
+            start = 0 if series.last_date is None else int(
+                df['date'].searchsorted(pd.Timestamp(series.last_date, tz=df['date'].dt.tz)))
+            rows = df.iloc[start:]
+            for date, value in zip(rows['date'].dt.strftime('%Y-%m-%d').tolist(), rows[column].tolist()):
+                series.push(date, float(value))
+                pushed += 1
+        self.logger.debug(f"Advanced rolling metrics by {pushed} values")
+        return self.snapshot()
+
+    def snapshot(self):
+        return {column: series.snapshot(self.z_threshold) for column, series in self.series.items()}
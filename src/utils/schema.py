@@ -0,0 +1,162 @@
+import json
+import sys
+from array import array
+from dataclasses import dataclass
+from operator import itemgetter
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+numbers = (int, float)
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def number(mapping, key, optional=False):
+    value = mapping.get(key) if optional else mapping[key]
+    if value is None and optional:
+        return None
+    if not isinstance(value, numbers) or isinstance(value, bool):
+        raise TypeError(f'{key} should be a number, got {value!r}')
+    return value
+
+
+def text(mapping, key):
+    value = mapping[key]
+    if not isinstance(value, str):
+        raise TypeError(f'{key} should be a string, got {value!r}')
+    return value
+
+
+@dataclass(slots=True)
+class Series:
+    # One graph-data series stored column-wise: dates are interned so every series shares the same strings and
+    # values sit in a flat float64 array
+    current_value: float | None
+    compare_value: float | None
+    dates: list
+    values: array
+
+    @classmethod
+    def decode(cls, payload):
+        snapshots = payload['snapshots']
+        dates = list(map(sys.intern, map(itemgetter('date'), snapshots)))
+        values = array('d', [snapshot['value'] for snapshot in snapshots])
+        return cls(number(payload, 'currentValue', optional=True), number(payload, 'compareValue', optional=True),
+                   dates, values)
+
+
+@dataclass(slots=True)
+class Market:
+    price: float
+    price_change_percentage_24: float
+
+    @classmethod
+    def decode(cls, payload):
+        return cls(number(payload, 'price'), number(payload, 'priceChangePercentage24'))
+
+
+@dataclass(slots=True)
+class NetworkStats:
+    date: str
+    active_lease_count: int
+    total_lease_count: int
+    daily_lease_count: int
+    total_uakt_spent: float
+    daily_uakt_spent: float
+    total_uusdc_spent: float
+    daily_uusdc_spent: float
+    total_uusd_spent: float
+    daily_uusd_spent: float
+    active_cpu: int
+    active_gpu: int
+    active_memory: int
+    active_storage: int
+
+    @classmethod
+    def decode(cls, payload):
+        return cls(text(payload, 'date'),
+                   *(number(payload, key) for key in ('activeLeaseCount', 'totalLeaseCount', 'dailyLeaseCount',
+                                                      'totalUAktSpent', 'dailyUAktSpent', 'totalUUsdcSpent',
+                                                      'dailyUUsdcSpent', 'totalUUsdSpent', 'dailyUUsdSpent',
+                                                      'activeCPU', 'activeGPU', 'activeMemory', 'activeStorage')))
+
+
+@dataclass(slots=True)
+class ChainStats:
+    staking_apr: float
+    bonded_tokens: float
+    total_supply: float
+
+    @classmethod
+    def decode(cls, payload):
+        return cls(number(payload, 'stakingAPR'), number(payload, 'bondedTokens'), number(payload, 'totalSupply'))
+
+
+@dataclass(slots=True)
+class Dashboard:
+    # Only the parts of dashboard-data the report reads are kept
+    now: NetworkStats
+    compare: NetworkStats
+    total_gpu: int
+    chain_stats: ChainStats
+
+    @classmethod
+    def decode(cls, payload):
+        return cls(NetworkStats.decode(payload['now']), NetworkStats.decode(payload['compare']),
+                   number(payload['networkCapacity'], 'totalGPU'), ChainStats.decode(payload['chainStats']))
+
+
+@dataclass(slots=True)
+class GpuModel:
+    vendor: str
+    model: str
+    ram: str
+    interface: str
+    total: int
+    available: int
+    price: float | None
+
+    @property
+    def name(self):
+        return f'{self.model} {self.ram} {self.interface}'
+
+    @classmethod
+    def decode(cls, payload):
+        availability = payload['availability']
+        price = payload['price']
+        return cls(text(payload, 'vendor'), text(payload, 'model'), text(payload, 'ram'), text(payload, 'interface'),
+                   number(availability, 'total'), number(availability, 'available'),
+                   number(price, 'avg', optional=True) if price else None)
+
+
+@dataclass(slots=True)
+class GpuPrices:
+    total: int
+    models: list
+
+    @classmethod
+    def decode(cls, payload):
+        return cls(number(payload['availability'], 'total'), [GpuModel.decode(model) for model in payload['models']])
+
+
+schemas = {'market': Market, 'dashboard': Dashboard, 'gpu_prices': GpuPrices}
+
+
+def decode(attr, body):
+    # Parses a response body straight into its typed form, series endpoints become Series and endpoints
+    # without a schema are returned as plain JSON
+    try:
+        payload = loads(body)
+        if attr in schemas:
+            return schemas[attr].decode(payload)
+        if isinstance(payload, dict) and 'snapshots' in payload:
+            return Series.decode(payload)
+        return payload
+    except (KeyError, TypeError, ValueError) as e:
+        raise SchemaError(f'Unexpected {attr} payload: {e!r}') from e
@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import sys
+import threading
+from array import array
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from utils.logger import logger
+from utils.schema import Series
+
+
+class SnapshotStore:
+    # Local copy of the graph-data and provider-graph-data series, one row per (attr, date)
+
+    def __init__(self, path='data/snapshots.db'):
+        super().__init__()
+        self.logger = logger.bind(classname=self.__class__.__name__)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS snapshots ('
+                                    'attr TEXT NOT NULL, date TEXT NOT NULL, value NUMERIC NOT NULL, '
+                                    'PRIMARY KEY (attr, date)) WITHOUT ROWID')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS syncs ('
+                                    'attr TEXT PRIMARY KEY, synced_at TEXT NOT NULL)')
+
+    def last_date(self, attr):
+        with self.lock:
+            row = self.connection.execute('SELECT MAX(date) FROM snapshots WHERE attr = ?', (attr,)).fetchone()
+        return row[0]
+
+    def synced_at(self, attr):
+        with self.lock:
+            row = self.connection.execute('SELECT synced_at FROM syncs WHERE attr = ?', (attr,)).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def is_current(self, attr, max_age):
+        # The APIs only publish a new snapshot per UTC day, so a series synced earlier today has nothing new to offer
+        synced_at = self.synced_at(attr)
+        if synced_at is None:
+            return False
+        now = datetime.now(timezone.utc)
+        return synced_at.date() == now.date() and (now - synced_at).total_seconds() < max_age
+
+    def merge(self, attr, series):
+        # Only the last stored day can still change, everything before it is settled history
+        last_date = self.last_date(attr)
+        rows = [(attr, date, value) for date, value in zip(series.dates, series.values)
+                if last_date is None or date >= last_date]
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO snapshots (attr, date, value) VALUES (?, ?, ?)', rows)
+            self.connection.execute('INSERT OR REPLACE INTO syncs (attr, synced_at) VALUES (?, ?)',
+                                    (attr, datetime.now(timezone.utc).isoformat()))
+        self.logger.debug(f"Merged {len(rows)} snapshots of {attr} after {last_date}")
+        return len(rows)
+
+    def snapshots(self, attrs, since=None):
+        query = (f"SELECT attr, date, value FROM snapshots WHERE attr IN ({', '.join('?' * len(attrs))})"
+                 f"{' AND date >= ?' if since else ''} ORDER BY attr, date")
+        params = [*attrs, since] if since else list(attrs)
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+        dates, values = defaultdict(list), defaultdict(lambda: array('d'))
+        for attr, date, value in rows:
+            dates[attr].append(sys.intern(date))
+            values[attr].append(value)
+        return {attr: Series(None, None, dates[attr], values[attr]) for attr in dates}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
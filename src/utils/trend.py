@@ -0,0 +1,75 @@
+from statistics import NormalDist
+
+import numpy as np
+
+methods = ('poly', 'lowess', 'rolling')
+
+
+def fit_trends(x, Y, method='poly', ci=95, order=2, frac=0.3, window=7):
+    # Fits every column of Y against x in one vectorised pass and returns (fit, band), with band being
+    # None or a (lower, upper) pair of arrays shaped like Y
+    assert method in methods
+    x = np.asarray(x, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    if method == 'poly':
+        fit, se = polynomial_trend(x, Y, order)
+    elif method == 'lowess':
+        fit, se = lowess_trend(x, Y, frac)
+    else:
+        fit, se = rolling_trend(Y, window)
+    if ci is None:
+        return fit, None
+    z = NormalDist().inv_cdf(0.5 + ci / 200)
+    return fit, (fit - z * se, fit + z * se)
+
+
+def polynomial_trend(x, Y, order=2):
+    # Least squares on a standardised Vandermonde matrix, the band is the analytic standard error of the mean fit
+    scale = x.std() or 1.0
+    X = np.vander((x - x.mean()) / scale, order + 1)
+    coef, *_ = np.linalg.lstsq(X, Y, rcond=None)
+    fit = X @ coef
+    dof = max(len(x) - order - 1, 1)
+    sigma2 = ((Y - fit) ** 2).sum(axis=0) / dof
+    leverage = np.einsum('ij,jk,ik->i', X, np.linalg.pinv(X.T @ X), X)
+    return fit, np.sqrt(np.outer(leverage, sigma2))
+
+
+def lowess_trend(x, Y, frac=0.3):
+    # Locally weighted linear regression with tricube weights, written as one linear smoother matrix L so that
+    # fit = L @ Y for all series at once
+    n = len(x)
+    x = (x - x.mean()) / (x.std() or 1.0)
+    neighbours = min(max(int(np.ceil(frac * n)), 2), n)
+    distances = np.abs(x[None, :] - x[:, None])
+    bandwidth = np.partition(distances, neighbours - 1, axis=1)[:, neighbours - 1]
+    weights = np.clip(1 - (distances / np.maximum(bandwidth, 1e-12)[:, None]) ** 3, 0, None) ** 3
+    s0 = weights.sum(axis=1)[:, None]
+    s1 = (weights @ x)[:, None]
+    s2 = (weights @ (x ** 2))[:, None]
+    determinant = s0 * s2 - s1 ** 2
+    determinant[determinant == 0] = np.inf
+    smoother = weights * (s2 - s1 * x[None, :] + x[:, None] * (s0 * x[None, :] - s1))
+    smoother /= determinant
+    fit = smoother @ Y
+    dof = max(n - np.trace(smoother), 1)
+    sigma2 = ((Y - fit) ** 2).sum(axis=0) / dof
+    return fit, np.sqrt(np.outer((smoother ** 2).sum(axis=1), sigma2))
+
+
+def rolling_trend(Y, window=7):
+    # Centred moving average through cumulative sums, the band is the standard error of each window's mean
+    n = len(Y)
+    half = window // 2
+    index = np.arange(n)
+    start = np.clip(index - half, 0, n)
+    end = np.clip(index + window - half, 0, n)
+    zeros = np.zeros((1, Y.shape[1]))
+    sums = np.vstack([zeros, np.cumsum(Y, axis=0)])
+    squares = np.vstack([zeros, np.cumsum(Y ** 2, axis=0)])
+    counts = (end - start)[:, None]
+    fit = (sums[end] - sums[start]) / counts
+    variance = np.clip((squares[end] - squares[start]) / counts - fit ** 2, 0, None)
+    return fit, np.sqrt(variance / counts)
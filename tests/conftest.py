@@ -0,0 +1,7 @@
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The code runs from src/ with configs/settings.yaml relative to the repository, as in the Docker image
+sys.path.insert(0, os.path.join(root, 'src'))
+os.environ.setdefault('ROOT_PATH_FOR_DYNACONF', root)
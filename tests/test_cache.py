@@ -0,0 +1,48 @@
+import os
+import time
+
+import requests
+
+from utils.cache import HTTPCache
+
+
+def response(content, etag=None):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = content
+    if etag:
+        response.headers['ETag'] = etag
+    return response
+
+
+def test_entries_keep_their_body_and_validators(tmp_path):
+    cache = HTTPCache(str(tmp_path), default_ttl=60, ttls={'market': 5})
+    cache.put('https://api/market', response(b'{"price": 1}', etag='"abc"'))
+    entry = cache.get('https://api/market')
+    assert entry.body() == b'{"price": 1}'
+    assert entry.validators() == {'If-None-Match': '"abc"'}
+    assert entry.age < cache.ttl('market') == 5
+    assert cache.ttl('dashboard') == 60
+    assert cache.get('https://api/dashboard') is None
+
+
+def test_revalidate_resets_the_age(tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    entry = cache.put('https://api/market', response(b'{}', etag='"abc"'))
+    entry.meta['fetched_at'] -= 3600
+    assert entry.age >= 3600
+    cache.revalidate('https://api/market', entry)
+    assert cache.get('https://api/market').age < 60
+
+
+def test_evicts_least_recently_used_bodies_first(tmp_path):
+    cache = HTTPCache(str(tmp_path), max_bytes=25)
+    for i, url in enumerate(['https://api/a', 'https://api/b']):
+        cache.put(url, response(b'x' * 10))
+        body_path = cache.paths(url)[0]
+        os.utime(body_path, (time.time() - 100 + i, time.time() - 100 + i))
+    cache.get('https://api/a')  # a is now the most recently used
+    cache.put('https://api/c', response(b'x' * 10))
+    assert cache.get('https://api/a') is not None
+    assert cache.get('https://api/b') is None
+    assert cache.get('https://api/c') is not None
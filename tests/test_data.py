@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from benchmarks.synthetic import synthetic_data
+from utils.data import AkashStatsProcessor, LazyData
+from utils.requirements import resolve
+from utils.schema import decode
+
+
+class Retriever:
+    # Just what LazyData reads of a retriever, counting the endpoints it loads
+    attr2url = {'market': 'market-data', 'gpu_prices': 'gpu-prices', 'gpu': 'gpu', 'activeGPU': 'activeGPU'}
+
+    def __init__(self, synced=()):
+        self.synced = set(synced)
+        self.loaded = []
+
+    def is_synced(self, attr):
+        return attr in self.synced
+
+    def load(self, attr):
+        self.loaded.append(attr)
+        return f'{attr} value'
+
+
+def test_missing_endpoints_are_loaded_once():
+    retriever = Retriever()
+    data = LazyData(retriever, {'market': 'market value'}, attempted=['market'])
+    assert data['market'] == 'market value'
+    assert data['gpu_prices'] == 'gpu_prices value'
+    assert data['gpu_prices'] == 'gpu_prices value'
+    assert retriever.loaded == ['gpu_prices']
+
+
+def test_attempted_and_unknown_endpoints_stay_missing():
+    retriever = Retriever()
+    data = LazyData(retriever, {}, attempted=['gpu_prices'])
+    with pytest.raises(KeyError):
+        data['gpu_prices']
+    with pytest.raises(KeyError):
+        data['unknown']
+    # get and in never load anything
+    assert data.get('market') is None and 'market' not in data
+    assert retriever.loaded == []
+
+
+def test_load_only_reads_series_the_store_lacks():
+    retriever = Retriever(synced=['gpu'])
+    data = LazyData(retriever, {'market': 'market value'})
+    data.load(['market', 'gpu', 'activeGPU'])
+    assert retriever.loaded == ['activeGPU']
+
+
+def test_processor_rebuilds_a_missing_dashboard_from_the_series():
+    payloads = synthetic_data(days=10)
+    _, attrs = resolve(['report', 'gpu_plot', 'usd_plot'])
+    data = {attr: decode(attr, json.dumps(payloads[attr])) for attr in attrs}
+    df, gpu_details, market, dashboard = AkashStatsProcessor()(data, attrs=attrs)
+    assert market is None and gpu_details.empty
+    assert dashboard.now.active_gpu == payloads['activeGPU']['snapshots'][-1]['value']
+    assert dashboard.compare.daily_uusd_spent == pytest.approx(payloads['dailyUUsdSpent']['snapshots'][-2]['value'])
+    assert dashboard.total_gpu == payloads['gpu']['snapshots'][-1]['value']
+    # Series that were not built are left empty instead of failing the rebuild
+    assert dashboard.now.active_cpu is None and dashboard.chain_stats is None
+
+
+def test_load_leaves_series_that_fell_back_to_the_store():
+    retriever = Retriever()
+    data = LazyData(retriever, {}, attempted=['activeGPU'])
+    data.load(['activeGPU', 'gpu'])
+    assert retriever.loaded == ['gpu']
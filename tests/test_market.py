@@ -0,0 +1,128 @@
+import math
+
+import numpy as np
+import pytest
+
+from utils.market import GpuMarketIndex, forward_fill
+from utils.schema import GpuModel, GpuPrices
+
+
+def prices(*listings):
+    # (model, total, available, price) listings as a decoded gpu-prices response
+    models = [GpuModel('nvidia', model, '80Gi', 'SXM5', total, available, price)
+              for model, total, available, price in listings]
+    return GpuPrices(sum(model.total for model in models), models)
+
+
+def name(model):
+    return f'{model} 80Gi SXM5'
+
+
+@pytest.fixture
+def index(tmp_path):
+    return GpuMarketIndex(str(tmp_path / 'gpu_index.npz'))
+
+
+def test_a_new_model_pads_the_days_before_it(index):
+    index.record('2024-01-01', prices(('h100', 20, 5, 1.5), ('a100', 10, 2, 1.0)))
+    index.record('2024-01-02', prices(('h100', 22, 6, 1.6), ('h200', 8, 8, None)))
+    assert index.models == [name('h100'), name('a100'), name('h200')]
+    assert index.total.tolist() == [[20, 10, -1], [22, -1, 8]]
+    assert index.available.tolist() == [[5, 2, -1], [6, -1, 8]]
+    assert np.isnan(index.price[0, 2]) and np.isnan(index.price[1, 1]) and np.isnan(index.price[1, 2])
+
+
+def test_a_day_is_inserted_in_order_and_upserted(index):
+    index.record('2024-01-01', prices(('h100', 20, 5, 1.5)))
+    index.record('2024-01-03', prices(('h100', 24, 7, 1.7), ('a100', 10, 2, 1.0)))
+    index.record('2024-01-02', prices(('h100', 22, 6, 1.6)))
+    assert index.days.astype(str).tolist() == ['2024-01-01', '2024-01-02', '2024-01-03']
+    assert index.total[:, 0].tolist() == [20, 22, 24]
+    assert index.total[1, 1] == -1
+    # Recording a day again replaces all of it, a model no longer listed goes back to missing
+    index.record('2024-01-03', prices(('h100', 30, 9, 1.8)))
+    assert len(index.days) == 3
+    assert index.total[2].tolist() == [30, -1]
+    assert np.isnan(index.price[2, 1])
+
+
+def test_listings_of_the_same_model_are_summed_and_averaged(index):
+    index.record('2024-01-01', prices(('h100', 4, 1, 1.0), ('h100', 6, 2, 2.0), ('h100', 2, 2, None),
+                                      ('a100', 3, 0, None)))
+    assert index.total[0].tolist() == [12, 3]
+    assert index.available[0].tolist() == [5, 0]
+    assert index.price[0, 0] == pytest.approx(1.5)
+    # A model without any priced listing has no price rather than a zero
+    assert np.isnan(index.price[0, 1])
+
+
+def test_state_round_trips_through_the_file(index):
+    index.record('2024-01-01', prices(('h100', 20, 5, 1.5)))
+    index.record('2024-01-02', prices(('a100', 10, 2, None)))
+    index.save()
+    restored = GpuMarketIndex(index.path)
+    assert restored.models == index.models
+    assert restored.days.tolist() == index.days.tolist()
+    assert restored.total.tolist() == index.total.tolist()
+    np.testing.assert_array_equal(restored.price, index.price)
+    # A model recorded after the reload keeps the existing columns
+    restored.record('2024-01-03', prices(('h100', 21, 4, 1.4)))
+    assert restored.total[:, 0].tolist() == [20, -1, 21]
+
+
+def test_changes_compare_the_same_calendar_day(index):
+    # 2024-01-03 was never recorded, so 2024-01-10 has nothing to compare with a week earlier even though
+    # there are seven recorded days before it
+    for day in [1, 2, 4, 5, 6, 7, 8, 9, 10]:
+        index.record(f'2024-01-{day:02d}', prices(('h100', 10 * day, day, float(day))))
+    days, models, changes = index.changes('price', periods=7)
+    assert models == [name('h100')]
+    by_day = dict(zip(days.astype(str).tolist(), changes[:, 0].tolist()))
+    assert by_day['2024-01-09'] == pytest.approx(9 / 2 - 1)
+    assert math.isnan(by_day['2024-01-10'])
+    assert all(math.isnan(by_day[f'2024-01-{day:02d}']) for day in [1, 2, 4, 5, 6, 7])
+    # Counts compare the same way, missing counts are not read as -1
+    _, _, totals = index.changes('total', periods=1)
+    assert totals[1, 0] == pytest.approx(1.0) and math.isnan(totals[2, 0])
+
+
+def test_movers_rank_by_the_largest_absolute_change(index):
+    assert index.movers() == []
+    index.record('2024-01-01', prices(('h100', 20, 5, 2.0), ('a100', 10, 2, 1.0), ('h200', 12, 1, 3.0),
+                                      ('l40', 11, 1, 1.0)))
+    index.record('2024-01-08', prices(('h100', 20, 5, 2.2), ('a100', 10, 2, 0.5), ('h200', 12, 1, None),
+                                      ('l40', 11, 1, 1.0)))
+    movers = index.movers('price', periods=7)
+    assert [(model, latest) for model, latest, _ in movers] == [(name('a100'), 0.5), (name('h100'), 2.2),
+                                                                  (name('l40'), 1.0)]
+    assert [change for _, _, change in movers] == pytest.approx([-0.5, 0.1, 0.0])
+    # Limited to some models, the ones without a change on the latest day are left out
+    assert [model for model, _, _ in index.movers('price', periods=7, models=[name('h200'), name('h100')])] == \
+        [name('h100')]
+
+
+def test_forward_fill_carries_the_last_value_per_column():
+    nan = np.nan
+    matrix = np.array([[1.0, nan, nan],
+                       [nan, 2.0, nan],
+                       [nan, nan, nan],
+                       [4.0, nan, 3.0]])
+    filled = forward_fill(matrix)
+    np.testing.assert_array_equal(filled, [[1.0, nan, nan],
+                                           [1.0, 2.0, nan],
+                                           [1.0, 2.0, nan],
+                                           [4.0, 2.0, 3.0]])
+    # The input is left as it was
+    assert np.isnan(matrix[1, 0])
+
+
+def test_top_models_on_a_recorded_day(index):
+    assert index.top_models() == []
+    index.record('2024-01-01', prices(('h100', 20, 5, 1.5), ('a100', 30, 2, 1.0)))
+    index.record('2024-01-03', prices(('h100', 25, 5, 1.5), ('h200', 12, 1, 3.0)))
+    assert index.top_models() == [name('h100'), name('h200')]
+    assert index.top_models(n=1, day='2024-01-01') == [name('a100')]
+    # Days that were not recorded have no top models, including the days after the last one
+    assert index.top_models(day='2024-01-02') == []
+    assert index.top_models(day='2024-01-04') == []
+    assert index.top_models(day='2023-12-31') == []
@@ -0,0 +1,97 @@
+import time
+from concurrent.futures import Future
+
+import pytest
+import tweepy
+
+from bot.fake import FakeResponse, FakeXAPI, FakeXClient
+from bot.publisher import RateLimiter, ThreadPublisher
+
+
+def test_rate_limiter_only_blocks_once_a_window_is_spent():
+    limiter = RateLimiter()
+    assert not limiter.update('create_tweet', {})
+    assert limiter.update('create_tweet', {'x-rate-limit-remaining': '5', 'x-rate-limit-reset': '0'})
+    start = time.monotonic()
+    limiter.wait('create_tweet')
+    assert time.monotonic() - start < 0.1
+    # A spent window is waited out until a second after its reset
+    reset = int(time.time())
+    limiter.update('create_tweet', {'x-rate-limit-remaining': '0', 'x-rate-limit-reset': str(reset)})
+    limiter.wait('create_tweet')
+    assert time.time() >= reset + 1
+
+
+def test_rate_limiter_spaces_calls_by_min_interval():
+    limiter = RateLimiter(min_interval=0.3)
+    limiter.wait('media_upload')
+    start = time.monotonic()
+    limiter.wait('media_upload')
+    assert time.monotonic() - start >= 0.25
+
+
+def test_call_retries_after_a_429_once_the_window_resets():
+    publisher = ThreadPublisher(FakeXAPI(latency=0), FakeXClient(latency=0))
+    calls = []
+
+    def create_tweet(**kwargs):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            headers = {'x-rate-limit-remaining': '0', 'x-rate-limit-reset': str(int(time.time()) - 1)}
+            raise tweepy.TooManyRequests(FakeResponse({'detail': 'Too Many Requests'}, headers, 429,
+                                                      'Too Many Requests'))
+        return FakeResponse({'id': '1'}, {'x-rate-limit-remaining': '10', 'x-rate-limit-reset': '0'})
+
+    assert publisher.call('create_tweet', create_tweet).json() == {'data': {'id': '1'}}
+    assert len(calls) == 2
+    assert publisher.limiter.limits['create_tweet'] == (10, 0)
+
+
+def test_call_gives_up_after_its_retries():
+    publisher = ThreadPublisher(FakeXAPI(latency=0), FakeXClient(latency=0), retries=1)
+
+    def create_tweet(**kwargs):
+        raise tweepy.TooManyRequests(FakeResponse({'detail': 'Too Many Requests'}, {}, 429, 'Too Many Requests'))
+
+    with pytest.raises(tweepy.TooManyRequests):
+        publisher.call('create_tweet', create_tweet)
+
+
+@pytest.fixture
+def charts(tmp_path):
+    paths = []
+    for name in ('gpu.png', 'usd.png'):
+        paths.append(str(tmp_path / name))
+        with open(paths[-1], 'wb') as f:
+            f.write(b'png')
+    return paths
+
+
+def test_post_thread_chains_replies_with_their_media(charts):
+    x_v1, x_client = FakeXAPI(latency=0), FakeXClient(latency=0)
+    publisher = ThreadPublisher(x_v1, x_client)
+    last = publisher.post_thread('report', ['gpu text', 'usd text'], publisher.upload(charts), final_tweet='bye')
+
+    tweets = x_client.tweets
+    assert [tweet['text'] for tweet in tweets] == ['report', 'gpu text', 'usd text', 'bye']
+    assert [tweet['in_reply_to_tweet_id'] for tweet in tweets] == [None, '1', '2', '3']
+    uploads = dict(x_v1.uploads)
+    assert [tweet['media_ids'] for tweet in tweets[1:3]] == [[uploads[charts[0]]], [uploads[charts[1]]]]
+    assert last == tweets[-1]['id']
+
+
+def test_a_failed_upload_posts_nothing(charts):
+    x_client = FakeXClient(latency=0)
+    publisher = ThreadPublisher(FakeXAPI(latency=0), x_client)
+    failed = Future()
+    failed.set_exception(OSError('upload failed'))
+    with pytest.raises(OSError):
+        publisher.post_thread('report', ['gpu text', 'usd text'], [publisher.upload(charts)[0], failed])
+    assert x_client.tweets == []
+
+
+def test_fake_client_refuses_duplicate_text():
+    x_client = FakeXClient(latency=0)
+    x_client.create_tweet(text='report')
+    with pytest.raises(tweepy.Forbidden):
+        x_client.create_tweet(text='report')
@@ -0,0 +1,49 @@
+import os
+import time
+
+import pandas as pd
+
+from utils.render import RenderCache
+
+
+def touch(path, size, age):
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    os.utime(path, (time.time() - age, time.time() - age))
+
+
+def test_key_follows_the_data_and_parameters_but_not_the_file_name(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    df = pd.DataFrame({'activeGPU': [1, 2, 3]})
+    key = cache.key('utils.plot:create_gpu_plot', (df,), {'name': 'a.png', 'amount': 4})
+    assert key == cache.key('utils.plot:create_gpu_plot', (df.copy(),), {'name': 'b.png', 'amount': 4})
+    assert key != cache.key('utils.plot:create_gpu_plot', (df,), {'name': 'a.png', 'amount': 7})
+    assert key != cache.key('utils.plot:create_gpu_plot', (df.assign(activeGPU=[1, 2, 4]),),
+                            {'name': 'a.png', 'amount': 4})
+
+
+def test_key_follows_the_shared_plotting_modules(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    args = ((), {'name': 'a.png'})
+    key = cache.key('utils.plot:create_gpu_plot', *args)
+    cache.hashes['utils.trend'] = 'changed'
+    assert cache.key('utils.plot:create_gpu_plot', *args) != key
+
+
+def test_get_returns_cached_charts_in_any_format(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    assert cache.get('utils.plot:create_gpu_plot', 'abc') is None
+    touch(cache.stem('utils.plot:create_gpu_plot', 'abc') + '.webp', 10, age=0)
+    assert cache.get('utils.plot:create_gpu_plot', 'abc').endswith('create_gpu_plot-abc.webp')
+
+
+def test_evicts_old_and_least_recently_used_charts(tmp_path):
+    cache = RenderCache(str(tmp_path), max_bytes=25, max_age=3600)
+    touch(tmp_path / 'expired.png', 1, age=7200)
+    touch(tmp_path / 'oldest.png', 10, age=300)
+    touch(tmp_path / 'older.png', 10, age=200)
+    touch(tmp_path / 'newest.webp', 10, age=100)
+    touch(tmp_path / 'kept.png', 10, age=7200)
+    touch(tmp_path / 'notes.txt', 100, age=7200)
+    cache.evict(keep={str(tmp_path / 'kept.png')})
+    assert sorted(os.listdir(tmp_path)) == ['kept.png', 'newest.webp', 'notes.txt', 'older.png']
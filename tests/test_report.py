@@ -0,0 +1,34 @@
+from llm.stream import weighted_length
+from utils.report import Reporter
+from utils.schema import ChainStats, Dashboard, Market, NetworkStats
+
+
+def network_stats(active_gpu, daily_uusd_spent):
+    return NetworkStats('2024-01-02', *[None] * 8, daily_uusd_spent, None, active_gpu, None, None)
+
+
+def test_full_report():
+    dashboard = Dashboard(network_stats(110, 2e12), network_stats(100, 1e12), 200, ChainStats(0.1, 50, 100))
+    report = Reporter().generate_report(Market(2.5, 1.0), dashboard)
+    assert '$AKT: 2.50$' in report
+    assert 'Active GPUs: 110 (+10.00% in 24h)' in report
+    assert 'Daily USD spent: $2000.00K (+100.00% in 24h)' in report
+
+
+def test_missing_documents_leave_their_lines_out():
+    report = Reporter().generate_report(None, None)
+    assert '$AKT' not in report and 'Active GPUs' not in report and 'USD spent' not in report
+    assert report.endswith('#AI')
+    # A dashboard rebuilt from stored series has no chain stats and may lack the GPU total
+    dashboard = Dashboard(network_stats(110, 2e12), network_stats(100, 1e12), None, None)
+    report = Reporter().generate_report(Market(2.5, 1.0), dashboard)
+    assert '$AKT' not in report and 'Active GPUs' not in report
+    assert 'Daily USD spent' in report
+
+
+def test_with_period_tells_shared_replies_apart_within_the_limit():
+    reporter = Reporter()
+    assert reporter.with_period('GPU prices') == 'GPU prices'
+    assert reporter.with_period('GPU prices', '4-week') == 'GPU prices (4-week view)'
+    tagged = reporter.with_period('word ' * 100, '12-month')
+    assert tagged.endswith('word (12-month view)') and weighted_length(tagged) <= reporter.char_limit
@@ -0,0 +1,27 @@
+from utils.data import AkashStatsProcessor
+from utils.requirements import requirements, resolve, series_of
+
+
+def test_columns_map_back_to_their_series():
+    assert series_of('dailyUsdSpent') == ['dailyUUsdSpent']
+    assert series_of('totalGPU') == ['gpu']
+    assert series_of('utilization') == ['activeGPU', 'gpu']
+    assert series_of('activeGPU') == ['activeGPU']
+
+
+def test_resolve_keeps_the_retriever_and_processor_order():
+    endpoints, attrs = resolve(['report', 'gpu_plot', 'gpu_details_plot', 'gpu_price_plot'])
+    assert attrs == ['activeGPU', 'gpu']
+    assert endpoints == ['market', 'dashboard', 'gpu_prices', 'activeGPU', 'gpu']
+
+
+def test_resolve_adds_extra_columns():
+    _, attrs = resolve(['report'], columns=['dailyUsdSpent'])
+    assert attrs == ['dailyUUsdSpent']
+    assert resolve([]) == ([], [])
+
+
+def test_every_required_column_is_built():
+    columns = {column for part in requirements.values() for column in part['columns']}
+    for column in columns:
+        assert all(attr in AkashStatsProcessor.attrs for attr in series_of(column))
@@ -0,0 +1,110 @@
+import json
+import time
+
+import pytest
+
+from benchmarks.replay import FixtureServer
+from benchmarks.synthetic import synthetic_data
+from utils.data import AkashStatsProcessor, AkashStatsRetriever
+from utils.requirements import resolve
+from utils.resilience import CircuitBreaker, CircuitOpenError, LatencyTracker
+from utils.schema import SchemaError
+
+
+def test_breaker_opens_after_failures_and_closes_after_a_trial():
+    breaker = CircuitBreaker(failures=2, reset_after=0.2)
+    breaker.failure('market')
+    breaker.before('market')
+    breaker.failure('market')
+    with pytest.raises(CircuitOpenError):
+        breaker.before('market')
+    time.sleep(0.25)
+    # Half open: a single trial goes through, a second one waits for its outcome
+    breaker.before('market')
+    with pytest.raises(CircuitOpenError):
+        breaker.before('market')
+    breaker.success('market')
+    breaker.before('market')
+    assert 'market' not in breaker.opened_at and 'market' not in breaker.counts
+
+
+def test_a_ticket_is_counted_once():
+    breaker = CircuitBreaker(failures=2)
+    ticket = {}
+    assert breaker.record('market', False, ticket)
+    assert not breaker.record('market', True, ticket)
+    assert not breaker.record('market', False, ticket)
+    assert breaker.counts == {'market': 1}
+
+
+def test_latency_budget_needs_enough_samples():
+    tracker = LatencyTracker(min_samples=3, min_budget=0.1)
+    tracker.record('market', 0.2)
+    assert tracker.budget('market') is None
+    for seconds in (0.3, 0.4, 5.0):
+        tracker.record('market', seconds)
+    assert tracker.budget('market') == 5.0
+
+
+@pytest.fixture
+def server():
+    with FixtureServer(synthetic_data(days=10), latency=0.01) as server:
+        yield server
+
+
+def test_deadline_falls_back_to_the_last_good_response(server, tmp_path):
+    cache = {'directory': str(tmp_path / 'http_cache'), 'default_ttl': 0}
+    retriever = server.register(AkashStatsRetriever(server.console_server, server.cloudmos_server, retries=0,
+                                                    cache=cache, deadline=0.5, breaker={'failures': 3}))
+    cached, _ = retriever.fetch_values(['market', 'dashboard'])
+    server.latencies['dashboard'] = 1.5
+    server.failing.add('market')
+    server.failing.add('gpu_prices')
+
+    stale = {}
+    start = time.perf_counter()
+    bodies, values = retriever.fetch_values(['market', 'dashboard', 'gpu_prices'], stale=stale)
+    assert set(values) == set(cached)
+    assert time.perf_counter() - start < 1.0
+    # Both fall back to the cache, gpu_prices has nothing to fall back to and is left out
+    assert bodies == cached
+    assert set(stale) == {'market', 'dashboard'}
+    # The late dashboard request still finishes in the background, only the missed deadline is counted
+    time.sleep(1.5)
+    assert retriever.breaker.counts == {'market': 1, 'dashboard': 1, 'gpu_prices': 1}
+
+
+def test_failing_series_fall_back_to_the_store(server, tmp_path):
+    retriever = server.register(AkashStatsRetriever(server.console_server, server.cloudmos_server, retries=0,
+                                                    store_path=str(tmp_path / 'snapshots.db'), store_max_age=0))
+    _, attrs = resolve(['report', 'gpu_plot', 'usd_plot'])
+    processor = AkashStatsProcessor(store=retriever.store)
+    expected = processor(retriever.retrieve('all', attrs=attrs), attrs=attrs)[0]
+    server.failing.add('activeGPU')
+
+    stale = {}
+    data = retriever.retrieve('all', stale=stale, attrs=attrs)
+    assert 'activeGPU' in stale and 'activeGPU' not in data
+    df = processor(data, attrs=attrs)[0]
+    assert df['activeGPU'].tolist() == expected['activeGPU'].tolist()
+
+
+def test_a_body_that_does_not_decode_falls_back_and_is_not_cached(server, tmp_path):
+    cache = {'directory': str(tmp_path / 'http_cache'), 'default_ttl': 0}
+    retriever = server.register(AkashStatsRetriever(server.console_server, server.cloudmos_server, retries=0,
+                                                    cache=cache, store_path=str(tmp_path / 'snapshots.db')))
+    good = retriever.fetch_body('gpu_prices')
+    payload = json.loads(good)
+    payload['availability']['total'] = None
+    body = json.dumps(payload).encode('utf-8')
+    server.bodies['gpu_prices'] = (body, '"invalid"')
+
+    stale = {}
+    data = retriever.retrieve('all', stale=stale, attrs=['gpu_prices', 'activeGPU'])
+    # Only the broken endpoint falls back, the rest of the fetch is kept and synced
+    assert set(stale) == {'gpu_prices'}
+    assert data['gpu_prices'] == retriever.decode('gpu_prices', good)
+    assert retriever.store.synced_at('activeGPU') is not None
+    assert retriever.cache.get(retriever.attr2url['gpu_prices']).body() == good
+    with pytest.raises(SchemaError):
+        retriever.fetch('gpu_prices', revalidate=True)
@@ -0,0 +1,58 @@
+import math
+import random
+
+import pandas as pd
+import pytest
+
+from utils.rolling import RollingMetrics, RollingSeries
+
+
+def recomputed(values, windows):
+    # The same figures straight from the values, the state RollingSeries keeps incrementally
+    longest = max(windows)
+    return ({window: math.fsum(values[-window:]) for window in windows},
+            math.fsum(value ** 2 for value in values[-longest:]))
+
+
+@pytest.mark.parametrize('windows', [(7, 30), (3,)])
+def test_push_and_pop_keep_the_running_sums_exact(windows):
+    rng = random.Random(0)
+    series = RollingSeries(windows)
+    values = []
+    for day in range(80):
+        value = rng.uniform(0, 1000)
+        series.push(f'day{day}', value)
+        values.append(value)
+        sums, squares = recomputed(values, windows)
+        assert series.sums == pytest.approx(sums)
+        assert series.squares == pytest.approx(squares)
+    # A pop takes back the latest day, including the values that left each window with it
+    series.pop()
+    values.pop()
+    sums, squares = recomputed(values, windows)
+    assert series.sums == pytest.approx(sums)
+    assert series.squares == pytest.approx(squares)
+
+
+def test_a_revised_day_replaces_the_old_value():
+    series = RollingSeries((3,))
+    for day, value in enumerate([1.0, 2.0, 3.0, 4.0]):
+        series.push(f'day{day}', value)
+    series.push('day3', 10.0)
+    assert list(series.values) == [1.0, 2.0, 3.0, 10.0]
+    assert series.sums[3] == pytest.approx(15.0)
+    assert series.snapshot()['ma3'] == pytest.approx(5.0)
+
+
+def test_state_round_trips_through_the_file(tmp_path):
+    path = str(tmp_path / 'rolling.json')
+    df = pd.DataFrame({'date': pd.date_range('2024-01-01', periods=40, tz='UTC'),
+                       'activeGPU': [float(i) for i in range(40)]})
+    metrics = RollingMetrics(path=path, columns=['activeGPU'])
+    snapshot = metrics.update(df.iloc[:35])
+    metrics.save()
+    # A later run only feeds the days from the stored last date on
+    restored = RollingMetrics(path=path, columns=['activeGPU'])
+    assert restored.update(df.iloc[:35]) == snapshot
+    assert restored.update(df)['activeGPU'] == RollingMetrics(path=None, columns=['activeGPU']).update(df)['activeGPU']
+    assert restored.snapshot()['activeGPU']['wow_pct'] == pytest.approx((39 / 32 - 1) * 100)
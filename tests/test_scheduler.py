@@ -0,0 +1,39 @@
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from bot.scheduler import Job, Scheduler
+
+
+def test_next_slot_skips_days_off():
+    job = Job('weekly', '12:00', prepare=None, publish=None, days=['monday'], tz='Europe/Athens')
+    slot = job.next_slot(pytz.utc.localize(datetime(2024, 1, 1, 10, 30)))  # a Monday, 12:30 in Athens
+    assert slot.isoformat() == '2024-01-08T12:00:00+02:00'
+
+
+def test_stale_artifacts_are_rebuilt_before_the_slot():
+    scheduler = Scheduler()
+    events = []
+
+    def prepare():
+        events.append(('prepare', time.monotonic()))
+        return len(events)
+
+    def publish(artifacts):
+        events.append(('publish', time.monotonic(), artifacts))
+        scheduler.stop()
+
+    job = Job('daily', '00:00', prepare=prepare, publish=publish, is_stale=lambda artifacts: artifacts == 1,
+              lead=1.0, refresh=0.5)
+    slot = datetime.now(pytz.utc) + timedelta(seconds=1.2)
+    job.next_slot = lambda after: slot
+    start = time.monotonic()
+    scheduler.run_job(job)
+
+    (_, prepared), (_, refreshed), (_, published, artifacts) = events
+    due = start + 1.2
+    # Prepared at the lead, prepared again at the refresh margin, published right at the slot
+    assert prepared - start < 0.4 and abs(refreshed - (due - 0.5)) < 0.2
+    assert due - 0.05 <= published < due + 0.2
+    assert artifacts == 2
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from utils import schema
+from utils.schema import GpuPrices, Market, SchemaError, Series, decode
+
+
+def gpu_prices(total=10):
+    return {'availability': {'total': total, 'available': 4},
+            'models': [{'vendor': 'nvidia', 'model': 'h100', 'ram': '80Gi', 'interface': 'SXM5',
+                        'availability': {'total': total, 'available': 4}, 'price': {'avg': 1.5}}]}
+
+
+def test_decodes_typed_payloads():
+    market = decode('market', b'{"price": 2.5, "priceChangePercentage24": -1.0}')
+    assert market == Market(2.5, -1.0)
+    prices = decode('gpu_prices', json.dumps(gpu_prices()).encode())
+    assert isinstance(prices, GpuPrices)
+    assert prices.models[0].name == 'h100 80Gi SXM5' and prices.models[0].price == 1.5
+    series = decode('activeGPU', b'{"currentValue": 3, "compareValue": null, "snapshots": '
+                                 b'[{"date": "2024-01-01", "value": 1}, {"date": "2024-01-02", "value": 3}]}')
+    assert isinstance(series, Series)
+    assert series.compare_value is None
+    assert series.dates == ['2024-01-01', '2024-01-02'] and list(series.values) == [1.0, 3.0]
+
+
+@pytest.mark.parametrize('attr, body', [
+    ('market', b'<html>502 Bad Gateway</html>'),
+    ('market', b'{"price": 2.5}'),
+    ('market', b'{"price": "2.5", "priceChangePercentage24": 1.0}'),
+    ('market', b'{"price": true, "priceChangePercentage24": 1.0}'),
+    ('gpu_prices', json.dumps(gpu_prices(total=None)).encode()),
+    ('dashboard', b'{"now": {}}'),
+    ('activeGPU', b'{"snapshots": [{"date": "2024-01-01", "value": null}]}'),
+    ('activeGPU', b'{"snapshots": [{"value": 1}]}'),
+])
+def test_rejects_bad_payloads(attr, body):
+    with pytest.raises(SchemaError, match=attr):
+        decode(attr, body)
+
+
+def test_schema_error_is_a_value_error():
+    # Callers that only knew the JSON decoder's ValueError still catch it
+    assert issubclass(SchemaError, ValueError)
+
+
+def test_uses_orjson_when_installed():
+    orjson = pytest.importorskip('orjson')
+    assert schema.loads is orjson.loads
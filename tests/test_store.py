@@ -0,0 +1,28 @@
+from array import array
+
+from utils.schema import Series
+from utils.store import SnapshotStore
+
+
+def series(days):
+    return Series(None, None, [date for date, _ in days], array('d', [value for _, value in days]))
+
+
+def test_merge_only_rewrites_from_the_last_stored_day(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshots.db'))
+    assert store.merge('activeGPU', series([('2024-01-01', 1), ('2024-01-02', 2)])) == 2
+    # A revised last day is replaced, settled history is left alone and new days are added
+    merged = store.merge('activeGPU', series([('2024-01-01', 10), ('2024-01-02', 3), ('2024-01-03', 4)]))
+    assert merged == 2
+    stored = store.snapshots(['activeGPU'])['activeGPU']
+    assert stored.dates == ['2024-01-01', '2024-01-02', '2024-01-03']
+    assert list(stored.values) == [1, 3, 4]
+    assert store.last_date('activeGPU') == '2024-01-03'
+    assert store.synced_at('activeGPU') is not None
+
+
+def test_snapshots_leave_out_series_never_synced(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshots.db'))
+    store.merge('gpu', series([('2024-01-01', 5)]))
+    assert set(store.snapshots(['gpu', 'activeGPU'])) == {'gpu'}
+    assert store.synced_at('activeGPU') is None
@@ -0,0 +1,29 @@
+import re
+
+import pytest
+
+from llm.stream import TagFilter
+
+
+text = 'Before <think>hidden <b> reasoning</think>visible</think> and after<think>never closed'
+expected = 'Before visible and after'
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 7, len(text)])
+def test_drops_tagged_segments_whatever_the_chunking(size):
+    tag_filter = TagFilter()
+    visible = ''.join(tag_filter.feed(text[i:i + size]) for i in range(0, len(text), size))
+    assert visible + tag_filter.flush() == expected
+
+
+def test_holds_back_only_a_possible_marker():
+    tag_filter = TagFilter()
+    assert tag_filter.feed('Hello <th') == 'Hello '
+    assert tag_filter.feed('ank you') == '<thank you'
+    assert tag_filter.flush() == ''
+
+
+def test_matches_a_non_streaming_strip():
+    tag_filter = TagFilter()
+    stripped = re.sub(r'<think>.*?(</think>|$)', '', text, flags=re.S).replace('</think>', '')
+    assert tag_filter.feed(text) + tag_filter.flush() == stripped